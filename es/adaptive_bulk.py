@@ -0,0 +1,233 @@
+import csv
+import random
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from elasticsearch import ApiError, TransportError, helpers
+
+# 整个 bulk 请求返回这些状态码时视为集群过载，整批退避后重试
+OVERLOAD_STATUS = (429, 502, 503, 504)
+
+
+class AdaptiveBulkSender:
+    """
+    按观察到的延迟和 429 拒绝自动调整批次大小（字节）和在途请求数的 bulk 写入工具（AIMD）：
+
+    - 没有拒绝且延迟低于 target_latency 时，批次大小按 step_bytes 线性增加，延迟低于一半时再增加一个在途请求
+    - 延迟超过 target_latency 时批次大小减半
+    - 出现 429 时批次大小和在途请求数都减半，只重试被拒绝的文档，重试前按指数退避并加随机抖动
+    - 整个请求返回 429/502/503/504、连接失败或超时时同样处理，整批文档都算作被拒绝
+
+    每次减小后，减小之前已经发出的批次不再触发调整，同一波拥塞只减半一次，而不是每个被拒绝的批次各减半一次。
+    其他错误（如 mapping 冲突）不重试，记录在 errors 中
+
+    :param request_timeout: 单个 bulk 请求的超时秒数，为 None 时使用客户端的设置
+    """
+
+    def __init__(self, es, target_latency=1.0, start_bytes=5 * 1024 ** 2, min_bytes=512 * 1024,
+                 max_bytes=50 * 1024 ** 2, step_bytes=1024 ** 2, max_in_flight=8, max_retries=8,
+                 base_backoff=0.5, max_backoff=30, request_timeout=None, verbose=True):
+        # 关闭客户端自身的重试，否则传输层重试会叠加在这里按文档的重试和退避之上；
+        # 连接错误和过载状态码由 _send 转成整批拒绝，在这里退避重试
+        options = {"max_retries": 0, "retry_on_status": ()}
+        if request_timeout is not None:
+            options["request_timeout"] = request_timeout
+        self.es = es.options(**options)
+        self.serializer = es.transport.serializers.get_serializer("application/json")
+        self.target_latency = target_latency
+        self.chunk_bytes = start_bytes
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.step_bytes = step_bytes
+        self.in_flight = 1
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.verbose = verbose
+        # 每次减小批次大小或在途请求数时加一，用来识别减小之前发出的批次
+        self.generation = 0
+        self.trace = []
+        self.errors = []
+
+    def _serialize(self, action):
+        header, source = helpers.expand_action(action)
+        lines = [self.serializer.dumps(header)]
+        if source is not None:
+            lines.append(source.encode("utf-8") if isinstance(source, str) else self.serializer.dumps(source))
+        return lines
+
+    def _backoff(self, attempt):
+        # full jitter：在 [0, min(上限, 基数 * 2^attempt)] 内随机，避免所有重试同时到达
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+
+    def _send(self, chunk):
+        """
+        发送一个批次，返回 (耗时, 被拒绝的条目, 失败的条目)
+        """
+        body = [line for item in chunk for line in item["lines"]]
+        start_time = time.perf_counter()
+        try:
+            response = self.es.bulk(operations=body, filter_path="errors,items.*.status,items.*.error")
+        except ApiError as e:
+            if e.status_code in OVERLOAD_STATUS:
+                return time.perf_counter() - start_time, chunk, []
+            raise
+        except TransportError as e:
+            # 连接失败或超时，请求可能已部分执行，重试时带 _id 的文档会被覆盖写入
+            if self.verbose:
+                print(f"  bulk 请求失败，整批退避重试: {e}")
+            return time.perf_counter() - start_time, chunk, []
+        seconds = time.perf_counter() - start_time
+        if not response.get("errors"):
+            return seconds, [], []
+
+        rejected, failed = [], []
+        for item, result in zip(chunk, response["items"]):
+            result = next(iter(result.values()))
+            if result["status"] == 429:
+                rejected.append(item)
+            elif result["status"] >= 300:
+                failed.append((item, result))
+        return seconds, rejected, failed
+
+    def _adjust(self, seconds, rejected, generation):
+        if generation != self.generation:
+            # 批次是按减小之前的设置发出的，它的结果已经反映在上一次减小中
+            return
+        if rejected:
+            self.chunk_bytes = max(self.min_bytes, self.chunk_bytes // 2)
+            self.in_flight = max(1, self.in_flight // 2)
+            self.generation += 1
+        elif seconds > self.target_latency:
+            self.chunk_bytes = max(self.min_bytes, self.chunk_bytes // 2)
+            self.generation += 1
+        else:
+            self.chunk_bytes = min(self.max_bytes, self.chunk_bytes + self.step_bytes)
+            if seconds < self.target_latency / 2:
+                self.in_flight = min(self.max_in_flight, self.in_flight + 1)
+
+    def send(self, actions):
+        """
+        写入 actions（与 helpers.bulk 相同格式），返回 (成功数, 失败数)
+        """
+        actions = iter(actions)
+        retries = deque()  # (可重试时间, item)，按可重试时间排序
+        pending = {}
+        success = failed = 0
+        exhausted = False
+        start_time = time.perf_counter()
+
+        def next_chunk():
+            nonlocal exhausted
+            chunk, size = [], 0
+            now = time.monotonic()
+            # 优先发送已经到了重试时间的文档
+            while retries and retries[0][0] <= now and size < self.chunk_bytes:
+                item = retries.popleft()[1]
+                chunk.append(item)
+                size += item["bytes"]
+            while not exhausted and size < self.chunk_bytes:
+                action = next(actions, None)
+                if action is None:
+                    exhausted = True
+                    break
+                lines = self._serialize(action)
+                item = {"lines": lines, "bytes": sum(len(line) + 1 for line in lines), "attempt": 0}
+                chunk.append(item)
+                size += item["bytes"]
+            return chunk, size
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            while True:
+                while len(pending) < self.in_flight:
+                    chunk, size = next_chunk()
+                    if not chunk:
+                        break
+                    pending[executor.submit(self._send, chunk)] = (chunk, size, self.chunk_bytes, self.in_flight,
+                                                                   self.generation)
+
+                if not pending:
+                    if exhausted and not retries:
+                        break
+                    # 只剩下还没到重试时间的文档
+                    time.sleep(max(0.0, retries[0][0] - time.monotonic()))
+                    continue
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk, size, target_bytes, in_flight, generation = pending.pop(future)
+                    seconds, rejected, errors = future.result()
+
+                    given_up = 0
+                    for item in rejected:
+                        item["attempt"] += 1
+                        if item["attempt"] > self.max_retries:
+                            given_up += 1
+                            errors.append((item, {"status": 429, "error": {"type": "es_rejected_execution_exception",
+                                                                           "reason": "超过最大重试次数"}}))
+                        else:
+                            retries.append((time.monotonic() + self._backoff(item["attempt"]), item))
+                    if rejected:
+                        # 保持重试队列按可重试时间排序
+                        retries = deque(sorted(retries, key=lambda r: r[0]))
+
+                    # errors 中超过重试次数的文档也在 rejected 中，不能重复扣减
+                    success += len(chunk) - len(rejected) - (len(errors) - given_up)
+                    failed += len(errors)
+                    # 只保留前 100 条错误详情
+                    self.errors.extend(result for _, result in errors[:max(0, 100 - len(self.errors))])
+                    self._adjust(seconds, rejected, generation)
+                    self._record(start_time, len(chunk), size, seconds, len(rejected), len(errors),
+                                 target_bytes, in_flight)
+
+        elapsed = time.perf_counter() - start_time
+        print(f"自适应 bulk 写入完成，成功 {success} 条，失败 {failed} 条，耗时 {elapsed:.2f} 秒，"
+              f"{success / elapsed:.0f} docs/s，最终批次 {self.chunk_bytes / 1024 ** 2:.1f} MB，在途 {self.in_flight}")
+        return success, failed
+
+    def _record(self, start_time, docs, size, seconds, rejected, failed, target_bytes, in_flight):
+        seconds = seconds or 1e-9
+        entry = {
+            "chunk": len(self.trace),
+            "elapsed": time.perf_counter() - start_time,
+            "docs": docs,
+            "bytes": size,
+            "seconds": seconds,
+            "docs_per_sec": docs / seconds,
+            "mb_per_sec": size / seconds / 1024 ** 2,
+            "rejected": rejected,
+            "failed": failed,
+            "chunk_bytes": target_bytes,
+            "in_flight": in_flight,
+        }
+        self.trace.append(entry)
+        if self.verbose:
+            print(f"  批次 {entry['chunk']}: {docs} 条, {size / 1024 ** 2:.2f} MB, {seconds * 1000:.0f}ms, "
+                  f"{entry['docs_per_sec']:.0f} docs/s, 拒绝 {rejected}, 失败 {failed}, 在途 {in_flight}")
+
+    def save_trace(self, path):
+        """
+        把每个批次的吞吐记录保存为 CSV
+        """
+        if not self.trace:
+            return
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(self.trace[0]))
+            writer.writeheader()
+            writer.writerows(self.trace)
+        print(f"批次记录已保存到 {path}")
+
+
+def adaptive_bulk(es, actions, trace_path=None, **options):
+    """
+    使用 AdaptiveBulkSender 写入 actions，返回 (成功数, 失败数)
+    """
+    sender = AdaptiveBulkSender(es, **options)
+    success, failed = sender.send(actions)
+    for error in sender.errors[:10]:
+        print(f"  失败示例: {error}")
+    if trace_path:
+        sender.save_trace(trace_path)
+    return success, failed
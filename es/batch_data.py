@@ -0,0 +1,178 @@
+from datetime import datetime
+
+import numpy as np
+
+# person_test 使用的姓名字表
+FIRST_NAMES = ['张', '王', '李', '赵', '陈', '黄', '周', '吴', '刘', '孙']
+LAST_NAMES = ['明', '芳', '静', '伟', '秀英', '强', '磊', '洋', '艳', '勇', '杰', '娟', '涛', '超', '鹏', '华', '平', '刚', '辉', '兰']
+
+# test_index 中 division_desc 的取值
+REGION_VALUES = [f"{1000 + i}" for i in range(10)]
+REP_OFFICE_VALUES = [f"{2000 + j}" for j in range(10)]
+
+# person 索引的取值
+REP_OFFICE_CHOICES = np.array([10, 11, 12])
+REP_CHOICES = np.array([9, 10, 11])
+
+# person_test 生日范围（1950-01-01 到 2005-12-31），以 epoch day 表示
+BIRTHDAY_START_DAY = int(np.datetime64("1950-01-01", "D").astype(np.int64))
+BIRTHDAY_END_DAY = int(np.datetime64("2005-12-31", "D").astype(np.int64))
+
+
+def _faker_pool(seed, size, provider):
+    """
+    用 Faker 预先生成一个取值池，之后按下标取值，避免逐条调用 Faker
+    """
+    from faker import Faker
+
+    fake = Faker()
+    fake.seed_instance(seed)
+    method = getattr(fake, provider)
+    return [method() for _ in range(size)]
+
+
+def _block_sizes(n, block_size):
+    for start in range(0, n, block_size):
+        yield min(block_size, n - start)
+
+
+def uuid4_bytes(rng, n):
+    """
+    批量生成 n 个 UUID4，返回 (n, 16) 的 uint8 数组
+    """
+    raw = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40  # version 4
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80  # RFC 4122 variant
+    return raw
+
+
+def uuid_strings(raw):
+    """
+    把 (n, 16) 的 UUID 字节数组转换成标准字符串形式
+    """
+    hex_all = raw.tobytes().hex()
+    return [
+        f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+        for h in (hex_all[i:i + 32] for i in range(0, len(hex_all), 32))
+    ]
+
+
+def random_subset_masks(rng, n, m):
+    """
+    与 get_random_array 相同的分布：先均匀选出子集大小 k（1..m），再均匀选出 k 个元素，
+    结果以位图表示，第 j 位为 1 表示选中第 j 个取值
+    """
+    k = rng.integers(1, m + 1, size=n)
+    ranks = rng.random((n, m)).argsort(axis=1).argsort(axis=1)
+    selected = ranks < k[:, None]
+    return (selected.astype(np.uint32) << np.arange(m, dtype=np.uint32)).sum(axis=1, dtype=np.uint32)
+
+
+def _mask_table(values):
+    # 预先计算每个位图对应的取值列表，序列化时直接查表
+    return [[v for j, v in enumerate(values) if mask >> j & 1] for mask in range(1 << len(values))]
+
+
+def person_columns(rng, n, name_pool, city_pool, now):
+    """
+    生成 person 索引的一批列数据
+    """
+    return {
+        "id": uuid4_bytes(rng, n),
+        "name": rng.integers(0, len(name_pool), size=n),
+        "age": rng.integers(18, 81, size=n),
+        "birthday": np.datetime64(now, "s") - rng.integers(365 * 18, 365 * 80 + 1, size=n).astype("timedelta64[D]"),
+        "region": rng.integers(0, len(city_pool), size=n),
+        "rep_office": rng.choice(REP_OFFICE_CHOICES, size=n),
+        "rep": rng.choice(REP_CHOICES, size=n),
+    }
+
+
+def iter_person_docs(n, seed=None, block_size=100_000, pool_size=4096):
+    """
+    按块生成 person 文档，返回 (doc_id, source) 的迭代器
+
+    相同的 seed 和 block_size 会生成相同的数据（birthday 相对于当前时间）
+    """
+    rng = np.random.default_rng(seed)
+    pool_seed = int(rng.integers(0, 2 ** 31))
+    name_pool = _faker_pool(pool_seed, pool_size, "name")
+    city_pool = _faker_pool(pool_seed, pool_size, "city")
+    now = datetime.now()
+
+    for size in _block_sizes(n, block_size):
+        cols = person_columns(rng, size, name_pool, city_pool, now)
+        ids = uuid_strings(cols["id"])
+        birthdays = np.datetime_as_string(cols["birthday"], unit="s").tolist()
+        for doc_id, name, age, birthday, region, rep_office, rep in zip(
+                ids, cols["name"].tolist(), cols["age"].tolist(), birthdays, cols["region"].tolist(),
+                cols["rep_office"].tolist(), cols["rep"].tolist()):
+            yield doc_id, {
+                "id": doc_id,
+                "name": name_pool[name],
+                "age": age,
+                "birthday": birthday,
+                "region": city_pool[region],
+                "rep_office": rep_office,
+                "rep": rep
+            }
+
+
+def person_test_columns(rng, n):
+    """
+    生成 person_test 索引的一批列数据，生日以 epoch day 表示
+    """
+    return {
+        "first_name": rng.integers(0, len(FIRST_NAMES), size=n),
+        "last_name": rng.integers(0, len(LAST_NAMES), size=n),
+        "age": rng.integers(18, 81, size=n),
+        "birthday": rng.integers(BIRTHDAY_START_DAY, BIRTHDAY_END_DAY + 1, size=n),
+    }
+
+
+def iter_person_test_docs(n, seed=None, block_size=100_000, start_id=1):
+    """
+    按块生成 person_test 文档，返回 (doc_id, source) 的迭代器，doc_id 从 start_id 开始
+    """
+    rng = np.random.default_rng(seed)
+    doc_id = start_id
+    for size in _block_sizes(n, block_size):
+        cols = person_test_columns(rng, size)
+        birthdays = np.datetime_as_string(cols["birthday"].astype("datetime64[D]")).tolist()
+        for first, last, age, birthday in zip(cols["first_name"].tolist(), cols["last_name"].tolist(),
+                                              cols["age"].tolist(), birthdays):
+            yield doc_id, {
+                "name": FIRST_NAMES[first] + LAST_NAMES[last],
+                "age": age,
+                "birthday": birthday
+            }
+            doc_id += 1
+
+
+def division_columns(rng, n):
+    """
+    生成 test_index 的一批列数据，region 和 repOffice 以位图表示
+    """
+    return {
+        "region": random_subset_masks(rng, n, len(REGION_VALUES)),
+        "repOffice": random_subset_masks(rng, n, len(REP_OFFICE_VALUES)),
+    }
+
+
+def iter_division_docs(n, seed=None, block_size=100_000, start_id=0):
+    """
+    按块生成 test_index 文档，返回 (doc_id, source) 的迭代器，doc_id 从 start_id 开始
+    """
+    rng = np.random.default_rng(seed)
+    region_table = _mask_table(REGION_VALUES)
+    rep_office_table = _mask_table(REP_OFFICE_VALUES)
+    doc_id = start_id
+    for size in _block_sizes(n, block_size):
+        cols = division_columns(rng, size)
+        for region, rep_office in zip(cols["region"].tolist(), cols["repOffice"].tolist()):
+            yield doc_id, {
+                "division_desc": [
+                    {"region": region_table[region], "repOffice": rep_office_table[rep_office]}
+                ]
+            }
+            doc_id += 1
@@ -0,0 +1,210 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from elasticsearch import ApiError
+
+from es.latency_stats import percentile
+
+# 集群没有返回设置时使用的默认值
+DEFAULT_MAX_TERMS_COUNT = 65536
+
+
+def _setting(response, key, default):
+    for section in ("transient", "persistent", "settings", "defaults"):
+        value = response.get(section, {}).get(key)
+        if value is not None:
+            return int(value)
+    return default
+
+
+def max_batch_size(es, index):
+    """
+    读取 index.max_terms_count，返回单个 terms 批次允许的最大 ID 数
+
+    超过 16 个取值的 terms 查询会改写成 TermInSetQuery，不受 indices.query.bool.max_clause_count 限制
+    """
+    index_settings = es.indices.get_settings(index=index, name="index.max_terms_count",
+                                             include_defaults=True, flat_settings=True)
+    # index 可能是别名，取第一个实际索引的设置
+    index_settings = next(iter(index_settings.values()), {})
+    max_terms = _setting(index_settings, "index.max_terms_count", DEFAULT_MAX_TERMS_COUNT)
+    print(f"索引 '{index}' index.max_terms_count: {max_terms}")
+    return max_terms
+
+
+def _is_limit_error(e):
+    message = str(e)
+    return e.status_code == 400 and ("max_terms_count" in message or "too_many" in message
+                                     or "exceeded the allowed maximum" in message)
+
+
+class BatchPlanner:
+    """
+    在运行中测量不同批次大小的延迟，选出最合适的批次大小
+
+    候选大小从 min_size 开始按 2 倍递增直到 max_size，min_size 不小于 max_size 时改用 max_size / 8，
+    保证至少有几个候选可以比较。先让每个候选各执行 samples_per_size 次，
+    之后使用当前最优的大小，每 explore_every 个批次轮流试一次相邻的大小，集群状态变化时可以跟着调整
+
+    :param goal: throughput 选每秒处理 ID 数最高的大小；
+                 tail 在吞吐不低于最高吞吐 min_throughput_ratio 倍的大小中，选单批次尾延迟最低的
+    """
+
+    def __init__(self, max_size, goal="throughput", min_size=64, samples_per_size=3, explore_every=20,
+                 window=20, tail_percentile=99, min_throughput_ratio=0.8):
+        if goal not in ("throughput", "tail"):
+            raise ValueError(f"未知的目标: {goal}")
+        if min_size < 1 or max_size < 1:
+            raise ValueError(f"批次大小必须为正数: min_size={min_size}, max_size={max_size}")
+        self.goal = goal
+        self.samples_per_size = samples_per_size
+        self.explore_every = explore_every
+        self.window = window
+        self.tail_percentile = tail_percentile
+        self.min_throughput_ratio = min_throughput_ratio
+        self.sizes = []
+        self.samples = {}
+        self.issued = {}
+        self.batches = 0
+        self._explore_up = True
+        self._lock = threading.Lock()
+        self._set_sizes(min_size, max_size)
+
+    def _set_sizes(self, min_size, max_size):
+        if min_size >= max_size:
+            min_size = max(1, max_size // 8)
+        sizes = []
+        size = min_size
+        while size < max_size:
+            sizes.append(size)
+            size *= 2
+        sizes.append(max_size)
+        self.sizes = sizes
+        for size in sizes:
+            self.samples.setdefault(size, deque(maxlen=self.window))
+            self.issued.setdefault(size, 0)
+
+    @property
+    def max_size(self):
+        return self.sizes[-1]
+
+    def next_size(self):
+        """
+        返回下一个批次应使用的大小
+        """
+        with self._lock:
+            self.batches += 1
+            # 探索阶段：每个候选依次执行 samples_per_size 次
+            for size in self.sizes:
+                if self.issued[size] < self.samples_per_size:
+                    self.issued[size] += 1
+                    return size
+
+            size = self._best_size()
+            if self.batches % self.explore_every == 0:
+                # 交替试探更大和更小的相邻大小
+                i = self.sizes.index(size) + (1 if self._explore_up else -1)
+                self._explore_up = not self._explore_up
+                if 0 <= i < len(self.sizes):
+                    size = self.sizes[i]
+            self.issued[size] += 1
+            return size
+
+    def record(self, size, items, seconds):
+        """
+        记录一个批次的实际 ID 数和耗时
+        """
+        with self._lock:
+            if size in self.samples:
+                self.samples[size].append((seconds, items))
+
+    def shrink(self, limit):
+        """
+        集群拒绝了 limit 大小的批次，之后只使用更小的大小
+        """
+        with self._lock:
+            max_size = max(1, limit // 2)
+            if max_size >= self.max_size:
+                return
+            self._set_sizes(min(self.sizes[0], max_size), max_size)
+            print(f"批次大小 {limit} 超出集群限制，最大批次调整为 {max_size}")
+
+    def throughput(self, size):
+        samples = self.samples[size]
+        seconds = sum(s for s, _ in samples)
+        return sum(n for _, n in samples) / seconds if seconds else 0.0
+
+    def tail_ms(self, size):
+        return percentile(sorted(s for s, _ in self.samples[size]), self.tail_percentile) * 1000
+
+    def _best_size(self):
+        measured = [size for size in self.sizes if self.samples[size]]
+        if not measured:
+            return self.max_size
+        if self.goal == "throughput":
+            return max(measured, key=self.throughput)
+        best_throughput = max(self.throughput(size) for size in measured)
+        eligible = [size for size in measured if self.throughput(size) >= best_throughput * self.min_throughput_ratio]
+        return min(eligible, key=self.tail_ms)
+
+    def best_size(self):
+        with self._lock:
+            return self._best_size()
+
+    def report(self):
+        with self._lock:
+            best = self._best_size()
+            print(f"批次大小规划（目标: {self.goal}）")
+            print(f"{'batch_size':>10} {'samples':>8} {'ids/s':>10} {'p50(ms)':>9} {f'p{self.tail_percentile}(ms)':>9}")
+            for size in self.sizes:
+                latencies = sorted(s for s, _ in self.samples[size])
+                if not latencies:
+                    continue
+                print(f"{size:>10} {len(latencies):>8} {self.throughput(size):>10.0f} "
+                      f"{percentile(latencies, 50) * 1000:>9.1f} {self.tail_ms(size):>9.1f}"
+                      + ("  <- 最优" if size == best else ""))
+            return best
+
+
+def iter_planned(planner, ids, run, concurrency=1):
+    """
+    按 planner 给出的大小切分 ids 并执行 run(batch)，最多 concurrency 个批次同时在途，按完成顺序返回结果
+
+    批次因超出 max_terms_count 被拒绝时，缩小最大批次并把该批次拆开重新执行
+    """
+    def timed(size, batch):
+        start_time = time.perf_counter()
+        result = run(batch)
+        planner.record(size, len(batch), time.perf_counter() - start_time)
+        return result
+
+    position = 0
+    retry = deque()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = {}
+        while True:
+            while len(pending) < concurrency and (retry or position < len(ids)):
+                if retry:
+                    batch = retry.popleft()
+                    size = len(batch)
+                else:
+                    size = planner.next_size()
+                    batch = ids[position:position + size]
+                    position += len(batch)
+                pending[executor.submit(timed, size, batch)] = batch
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch = pending.pop(future)
+                try:
+                    yield future.result()
+                except ApiError as e:
+                    if not _is_limit_error(e) or len(batch) <= 1:
+                        raise
+                    planner.shrink(len(batch))
+                    step = planner.max_size
+                    retry.extend(batch[i:i + step] for i in range(0, len(batch), step))
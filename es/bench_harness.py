@@ -0,0 +1,104 @@
+import json
+import time
+from datetime import datetime
+
+from es.latency_stats import summarize
+
+# 报告中的百分位数
+REPORT_PERCENTILES = (50, 90, 99)
+
+
+def histogram(samples, bins=10):
+    """
+    把样本按等宽区间分桶，返回 [(下界, 上界, 数量), ...]
+    """
+    if not samples:
+        return []
+    low, high = min(samples), max(samples)
+    width = (high - low) / bins or 1.0
+    counts = [0] * bins
+    for v in samples:
+        counts[min(int((v - low) / width), bins - 1)] += 1
+    return [(low + i * width, low + (i + 1) * width, c) for i, c in enumerate(counts)]
+
+
+class BenchmarkHarness:
+    """
+    统一的查询基准测试工具：注册命名查询，先预热再正式测量，
+    分别记录服务端 took 和客户端耗时（perf_counter_ns），输出百分位数、直方图和 JSON 结果
+    """
+
+    def __init__(self, warmup=5, iterations=50, on_phase=None):
+        """
+        :param on_phase: 可选回调 on_phase(phase, name)，在每个查询进入 "warmup" / "measured" 阶段时调用，
+                         用于给后台采集的集群指标打上阶段标签
+        """
+        self.warmup = warmup
+        self.iterations = iterations
+        self.on_phase = on_phase
+        self.queries = {}
+
+    def register(self, name, run):
+        """
+        注册一个查询，run 为无参函数，返回 Elasticsearch 响应（包含 took）
+        """
+        self.queries[name] = run
+        return self
+
+    def run_one(self, name):
+        run = self.queries[name]
+        if self.on_phase:
+            self.on_phase("warmup", name)
+        for _ in range(self.warmup):
+            run()
+
+        if self.on_phase:
+            self.on_phase("measured", name)
+
+        client_ms = []
+        server_ms = []
+        for _ in range(self.iterations):
+            start = time.perf_counter_ns()
+            response = run()
+            client_ms.append((time.perf_counter_ns() - start) / 1e6)
+            took = response.get("took") if response is not None else None
+            if took is not None:
+                server_ms.append(took)
+
+        return {
+            "warmup": self.warmup,
+            "iterations": self.iterations,
+            "client_ms": summarize(client_ms, REPORT_PERCENTILES),
+            "server_ms": summarize(server_ms, REPORT_PERCENTILES),
+            "histogram": histogram(client_ms),
+            "samples": {"client_ms": client_ms, "server_ms": server_ms}
+        }
+
+    def run(self, names=None):
+        """
+        依次运行指定（默认全部）查询，返回 {name: result}
+        """
+        return {name: self.run_one(name) for name in (names or self.queries)}
+
+    @staticmethod
+    def report(results):
+        for name, result in results.items():
+            print(f"=== {name} (预热 {result['warmup']} 次, 测量 {result['iterations']} 次) ===")
+            for label in ("client_ms", "server_ms"):
+                s = result[label]
+                if not s["count"]:
+                    continue
+                print(f"  {label:<10} p50 {s['p50']:.2f}  p90 {s['p90']:.2f}  p99 {s['p99']:.2f}  max {s['max']:.2f}")
+            peak = max((c for _, _, c in result["histogram"]), default=0)
+            for low, high, count in result["histogram"]:
+                bar = "#" * (round(count * 40 / peak) if peak else 0)
+                print(f"  {low:9.2f} - {high:9.2f} ms | {bar} {count}")
+
+    @staticmethod
+    def save_json(results, path):
+        """
+        保存为 JSON，便于不同时间的运行结果做对比
+        """
+        with open(path, "w") as f:
+            json.dump({"timestamp": datetime.now().isoformat(), "results": results}, f, indent=2)
+        print(f"结果已保存到 {path}")
@@ -0,0 +1,101 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from elasticsearch import helpers
+
+from es.es_client import get_client
+
+
+def _split_records(num_records, shards):
+    """
+    把 num_records 条记录切成 shards 段，返回 (start, count) 列表
+    """
+    base, extra = divmod(num_records, shards)
+    ranges = []
+    start = 0
+    for i in range(shards):
+        count = base + (1 if i < extra else 0)
+        if count:
+            ranges.append((start, count))
+        start += count
+    return ranges
+
+
+def _load_shard(worker_id, hosts, index, build_actions, start, count, seed,
+                chunk_size, in_flight, request_timeout):
+    """
+    在子进程中生成一段文档并写入 Elasticsearch，返回该 worker 的统计信息
+    """
+    # 客户端不能跨进程共享，每个 worker 进程各自创建
+    es = get_client(hosts).options(request_timeout=request_timeout)
+    stats = {"worker": worker_id, "docs": 0, "bytes": 0, "failed": 0}
+
+    def actions():
+        for doc_id, source in build_actions(start, count, seed):
+            # 预先序列化，既用于统计字节数，也避免 helpers 再序列化一次
+            body = json.dumps(source, ensure_ascii=False)
+            stats["bytes"] += len(body.encode("utf-8"))
+            yield {"_index": index, "_id": doc_id, "_source": body}
+
+    start_time = time.perf_counter()
+    if in_flight > 1:
+        results = helpers.parallel_bulk(es, actions(), thread_count=in_flight, queue_size=in_flight,
+                                        chunk_size=chunk_size, raise_on_error=False)
+    else:
+        results = helpers.streaming_bulk(es, actions(), chunk_size=chunk_size, raise_on_error=False)
+
+    for ok, _ in results:
+        if ok:
+            stats["docs"] += 1
+        else:
+            stats["failed"] += 1
+    stats["seconds"] = time.perf_counter() - start_time
+    return stats
+
+
+def parallel_load(hosts, index, build_actions, num_records, workers=None, in_flight=2,
+                  chunk_size=500, seed=None, request_timeout=60):
+    """
+    多进程生成文档并批量写入
+
+    :param hosts: Elasticsearch 地址，传给每个 worker 自己创建客户端，为 None 时使用环境变量 ES_HOSTS
+    :param index: 目标索引
+    :param build_actions: 可 pickle 的函数 build_actions(start, count, seed)，
+                          返回 (doc_id, source) 的可迭代对象
+    :param num_records: 总文档数
+    :param workers: 进程数，默认为 CPU 核数
+    :param in_flight: 每个 worker 同时在途的 bulk 请求数，1 表示使用 streaming_bulk
+    :param chunk_size: 每个 bulk 请求的文档数
+    :param seed: 随机种子，每个 worker 使用 seed + worker_id；为 None 时不固定
+    :return: 每个 worker 的统计信息列表
+    """
+    workers = workers or os.cpu_count() or 1
+    ranges = _split_records(num_records, workers)
+
+    print(f"开始并行写入 {num_records} 条数据到 '{index}'，进程数: {len(ranges)}，每进程在途请求数: {in_flight}")
+    start_time = time.perf_counter()
+    all_stats = []
+    with ProcessPoolExecutor(max_workers=len(ranges)) as executor:
+        futures = [
+            executor.submit(_load_shard, worker_id, hosts, index, build_actions, start, count,
+                            None if seed is None else seed + worker_id,
+                            chunk_size, in_flight, request_timeout)
+            for worker_id, (start, count) in enumerate(ranges)
+        ]
+        for future in as_completed(futures):
+            stats = future.result()
+            all_stats.append(stats)
+            seconds = stats["seconds"] or 1e-9
+            print(f"  worker {stats['worker']}: {stats['docs']} 条成功, {stats['failed']} 条失败, "
+                  f"{stats['docs'] / seconds:.0f} docs/s, {stats['bytes'] / seconds / 1024 ** 2:.2f} MB/s")
+
+    elapsed = time.perf_counter() - start_time
+    total_docs = sum(s["docs"] for s in all_stats)
+    total_failed = sum(s["failed"] for s in all_stats)
+    total_bytes = sum(s["bytes"] for s in all_stats)
+    print(f"并行写入完成，成功 {total_docs} 条，失败 {total_failed} 条，耗时 {elapsed:.2f} 秒，"
+          f"{total_docs / elapsed:.0f} docs/s, {total_bytes / elapsed / 1024 ** 2:.2f} MB/s")
+    all_stats.sort(key=lambda s: s["worker"])
+    return all_stats
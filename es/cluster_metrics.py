@@ -0,0 +1,225 @@
+import csv
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from es.es_client import client_options, get_hosts, get_http_session
+
+# 只取需要的字段，_nodes/stats 的完整响应在节点多时有几百 KB
+NODE_STATS_FILTER = ",".join([
+    "nodes.*.name",
+    "nodes.*.os.cpu.percent",
+    "nodes.*.jvm.mem.heap_used_percent",
+    "nodes.*.jvm.gc.collectors",
+    "nodes.*.indices.search.query_total",
+    "nodes.*.indices.search.query_time_in_millis",
+    "nodes.*.indices.indexing.index_total",
+    "nodes.*.indices.indexing.index_time_in_millis",
+    "nodes.*.thread_pool.search",
+    "nodes.*.thread_pool.write",
+])
+
+# 每个节点每次采样输出的字段
+NODE_FIELDS = [
+    "cpu_percent", "heap_percent",
+    "search_rate", "search_latency_ms", "index_rate", "index_latency_ms",
+    "gc_count", "gc_ms",
+    "search_queue", "search_rejected", "write_queue", "write_rejected",
+]
+
+CSV_FIELDS = ["timestamp", "elapsed", "status", "number_of_nodes", "unassigned_shards", "node"] + NODE_FIELDS
+
+HEALTH_VALUES = {"green": 0, "yellow": 1, "red": 2}
+
+
+def _delta(current, previous):
+    # 节点重启后计数器会归零，此时直接使用当前值
+    return current - previous if current >= previous else current
+
+
+def _counters(node):
+    """
+    从单个节点的统计中取出累计计数器
+    """
+    indices = node.get("indices", {})
+    search = indices.get("search", {})
+    indexing = indices.get("indexing", {})
+    collectors = node.get("jvm", {}).get("gc", {}).get("collectors", {}).values()
+    pools = node.get("thread_pool", {})
+    return {
+        "query_total": search.get("query_total", 0),
+        "query_time": search.get("query_time_in_millis", 0),
+        "index_total": indexing.get("index_total", 0),
+        "index_time": indexing.get("index_time_in_millis", 0),
+        "gc_count": sum(c.get("collection_count", 0) for c in collectors),
+        "gc_ms": sum(c.get("collection_time_in_millis", 0) for c in collectors),
+        "search_rejected": pools.get("search", {}).get("rejected", 0),
+        "write_rejected": pools.get("write", {}).get("rejected", 0),
+    }
+
+
+class MetricsCollector:
+    """
+    周期性采集集群指标，计算每个采样区间内各节点的增量：
+    查询/写入速率和平均延迟、GC 次数和耗时、线程池拒绝数
+
+    _nodes/stats 中的计数器都是进程启动以来的累计值，直接相除得到的是整个生命周期的平均，
+    这里保存上一次的计数器，只统计两次采样之间的变化
+    """
+
+    def __init__(self, es_host=None, max_samples=720):
+        # es_host 为 None 时使用 ES_HOSTS 中的第一个地址
+        self.es_host = es_host or get_hosts()[0]
+        self.samples = deque(maxlen=max_samples)
+        self.session = get_http_session()
+        self.timeout = client_options()["request_timeout"]
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.start_time = None
+        self._previous = None
+        self._lock = threading.Lock()
+
+    def _get(self, path, params=None):
+        response = self.session.get(f"{self.es_host}{path}", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def fetch(self):
+        """
+        并发获取节点统计和集群健康状态，返回 (采集时间, nodes, health)
+        """
+        nodes_future = self.executor.submit(self._get, "/_nodes/stats/os,jvm,indices,thread_pool",
+                                            {"filter_path": NODE_STATS_FILTER})
+        health_future = self.executor.submit(self._get, "/_cluster/health")
+        nodes, health = nodes_future.result().get("nodes", {}), health_future.result()
+        return time.monotonic(), nodes, health
+
+    def sample(self):
+        """
+        采集一次，返回本次采样；第一次调用只记录基线，返回 None
+
+        可以在多个线程中调用，采样依次执行，每个窗口从上一次采样的时间开始
+        """
+        with self._lock:
+            return self._sample()
+
+    def _sample(self):
+        now, nodes, health = self.fetch()
+        counters = {node_id: _counters(node) for node_id, node in nodes.items()}
+        previous = self._previous
+        self._previous = (now, counters)
+        if previous is None:
+            self.start_time = now
+            return None
+
+        previous_time, previous_counters = previous
+        seconds = (now - previous_time) or 1e-9
+        rows = []
+        for node_id, node in nodes.items():
+            current = counters[node_id]
+            # 新加入的节点没有上一次的计数器，以零为基线
+            before = previous_counters.get(node_id, dict.fromkeys(current, 0))
+            d = {key: _delta(current[key], before[key]) for key in current}
+            pools = node.get("thread_pool", {})
+            rows.append({
+                "node": node.get("name", node_id),
+                "cpu_percent": node.get("os", {}).get("cpu", {}).get("percent", 0),
+                "heap_percent": node.get("jvm", {}).get("mem", {}).get("heap_used_percent", 0),
+                "search_rate": d["query_total"] / seconds,
+                "search_latency_ms": d["query_time"] / d["query_total"] if d["query_total"] else 0.0,
+                "index_rate": d["index_total"] / seconds,
+                "index_latency_ms": d["index_time"] / d["index_total"] if d["index_total"] else 0.0,
+                "gc_count": d["gc_count"],
+                "gc_ms": d["gc_ms"],
+                "search_queue": pools.get("search", {}).get("queue", 0),
+                "search_rejected": d["search_rejected"],
+                "write_queue": pools.get("write", {}).get("queue", 0),
+                "write_rejected": d["write_rejected"],
+            })
+
+        sample = {
+            "timestamp": datetime.now().strftime("%H:%M:%S"),
+            "time": now,
+            "elapsed": now - self.start_time,
+            "status": health.get("status", "unknown"),
+            "number_of_nodes": health.get("number_of_nodes", 0),
+            "unassigned_shards": health.get("unassigned_shards", 0),
+            "nodes": rows,
+        }
+        self.samples.append(sample)
+        return sample
+
+    def run(self, interval=5, duration=60, on_sample=None, stop_event=None):
+        """
+        按固定间隔采样 duration 秒，on_sample 在每次得到新采样时被调用
+
+        :param duration: 为 None 时一直采样，直到 stop_event 被设置
+        :param stop_event: threading.Event，设置后在当前间隔结束前返回
+        """
+        end_time = None if duration is None else time.monotonic() + duration
+        next_time = time.monotonic()
+        while end_time is None or next_time <= end_time:
+            try:
+                sample = self.sample()
+                if sample is not None and on_sample is not None:
+                    on_sample(sample)
+            except Exception as e:
+                print(f"采样出错: {e}")
+            # 按计划时间而不是上次结束时间计算下一次采样，采集本身的耗时不会累积成漂移
+            next_time += interval
+            wait_seconds = max(0.0, next_time - time.monotonic())
+            if stop_event is None:
+                time.sleep(wait_seconds)
+            elif stop_event.wait(wait_seconds):
+                break
+
+    def rows(self):
+        """
+        把采样展开为每个节点一行
+        """
+        for sample in self.samples:
+            head = {key: sample[key] for key in CSV_FIELDS[:5]}
+            for row in sample["nodes"]:
+                yield {**head, **row}
+
+    def to_csv(self, path):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.rows())
+        print(f"已导出 {len(self.samples)} 次采样到 {path}")
+
+    def to_prometheus(self):
+        """
+        以 Prometheus 文本格式输出最近一次采样
+        """
+        if not self.samples:
+            return ""
+        sample = self.samples[-1]
+        lines = [
+            "# TYPE es_cluster_status gauge",
+            f"es_cluster_status {HEALTH_VALUES.get(sample['status'], 3)}",
+            "# TYPE es_cluster_unassigned_shards gauge",
+            f"es_cluster_unassigned_shards {sample['unassigned_shards']}",
+        ]
+        for field in NODE_FIELDS:
+            lines.append(f"# TYPE es_node_{field} gauge")
+            for row in sample["nodes"]:
+                lines.append(f'es_node_{field}{{node="{row["node"]}"}} {row[field]}')
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+
+if __name__ == "__main__":
+    # 连接地址通过环境变量 ES_HOSTS 设置
+    collector = MetricsCollector()
+    collector.run(interval=5, duration=60, on_sample=lambda s: print(
+        s["timestamp"], s["status"], [(r["node"], f"{r['search_rate']:.1f}/s", f"{r['search_latency_ms']:.2f}ms")
+                                      for r in s["nodes"]]))
+    collector.to_csv("cluster_metrics.csv")
+    print(collector.to_prometheus())
+    collector.close()
@@ -0,0 +1,70 @@
+from functools import partial
+
+from es.concurrent_pages import iter_concurrent_pages
+
+
+def hex_prefix_partitions(field, partitions):
+    """
+    按十六进制前两位把 UUID 形式的 keyword 字段切成若干 range 过滤条件（最多 256 个分区）
+
+    第一个分区没有下界、最后一个分区没有上界，保证所有取值都被覆盖且不重复
+    """
+    partitions = max(1, min(partitions, 256))
+    bounds = [f"{i * 256 // partitions:02x}" for i in range(partitions)] + [None]
+    filters = []
+    for i in range(partitions):
+        condition = {}
+        if i > 0:
+            condition["gte"] = bounds[i]
+        if bounds[i + 1] is not None:
+            condition["lt"] = bounds[i + 1]
+        filters.append({"range": {field: condition}} if condition else {"match_all": {}})
+    return filters
+
+
+def iter_composite_buckets(es, index, sources, aggs=None, query=None, partitions=None, page_size=1000,
+                           row=None, queue_pages=None, slim=False):
+    """
+    用 composite 聚合配合 after_key 分页遍历所有桶，多个分区并发执行
+
+    :param es: Elasticsearch 客户端（多线程共享）
+    :param index: 索引名称
+    :param sources: composite 聚合的 sources
+    :param aggs: 每个桶下的子聚合
+    :param query: 顶层查询条件
+    :param partitions: 过滤条件列表，每个分区一个线程，例如 hex_prefix_partitions 的结果
+    :param page_size: 每页桶数，决定单次请求的协调节点内存
+    :param row: 把桶转换成结果行的函数，默认直接返回桶
+    :param queue_pages: 最多缓存的页数
+    :param slim: 为 True 时用 filter_path 只返回桶和 after_key，去掉 took / _shards / hits 等
+    :return: 按到达顺序返回结果行的迭代器
+    """
+    composite = {"composite": {"size": page_size, "sources": sources}}
+    if aggs:
+        composite["aggs"] = aggs
+
+    filter_path = "aggregations.pages.after_key,aggregations.pages.buckets" if slim else None
+
+    def read_partition(partition):
+        filters = [f for f in (query, partition) if f]
+        body = {
+            "size": 0,
+            "query": {"bool": {"filter": filters}} if filters else {"match_all": {}},
+            "aggs": {"pages": composite}
+        }
+        after_key = None
+        while True:
+            if after_key is not None:
+                body["aggs"] = {"pages": {**composite, "composite": {**composite["composite"], "after": after_key}}}
+            response = es.search(index=index, body=body, filter_path=filter_path)
+            result = response.get("aggregations", {}).get("pages", {})
+            buckets = result.get("buckets", [])
+            if not buckets:
+                return
+            yield [row(b) for b in buckets] if row else buckets
+            after_key = result.get("after_key")
+            if after_key is None:
+                return
+
+    readers = [partial(read_partition, p) for p in (partitions or [None])]
+    return iter_concurrent_pages(readers, queue_pages)
@@ -0,0 +1,55 @@
+import queue
+import threading
+
+# 单个读取线程结束的标记
+_READER_DONE = object()
+
+
+def iter_concurrent_pages(readers, queue_pages=None):
+    """
+    每个 reader 在独立线程中运行，按到达顺序返回它们产出的元素
+
+    :param readers: 无参函数列表，每个函数返回一个按页产出列表的迭代器
+    :param queue_pages: 最多缓存的页数，默认为 reader 数 * 2，用于限制内存
+    :return: 逐个返回页内元素的迭代器，中途退出时会通知所有线程停止
+    """
+    pages = queue.Queue(maxsize=queue_pages or len(readers) * 2)
+    stop = threading.Event()
+
+    def put(item):
+        # 消费者提前退出时不再阻塞在 put 上
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def run(reader):
+        try:
+            for page in reader():
+                if stop.is_set():
+                    break
+                put(page)
+        except Exception as e:
+            put(e)
+        finally:
+            put(_READER_DONE)
+
+    threads = [threading.Thread(target=run, args=(reader,), daemon=True) for reader in readers]
+    for t in threads:
+        t.start()
+    try:
+        remaining = len(threads)
+        while remaining:
+            item = pages.get()
+            if item is _READER_DONE:
+                remaining -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield from item
+    finally:
+        stop.set()
+        for t in threads:
+            t.join()
@@ -1,7 +1,7 @@
-from elasticsearch import Elasticsearch
+from es.es_client import get_client
 
 # 连接到 Elasticsearch
-es = Elasticsearch([{'host': 'localhost', 'port': 9200, 'scheme': 'http'}])
+es = get_client()
 
 # 检查连接是否成功
 if not es.ping():
@@ -0,0 +1,128 @@
+import os
+import threading
+
+from elasticsearch import AsyncElasticsearch, Elasticsearch
+
+from es.timed_serializer import TimedJsonSerializer
+
+try:
+    import aiohttp
+except ImportError:  # 异步客户端依赖 aiohttp，可用 pip install "elasticsearch[async]" 安装
+    aiohttp = None
+
+# 默认连接地址，可以用环境变量 ES_HOSTS 覆盖（多个地址用逗号分隔）
+DEFAULT_HOSTS = "http://localhost:9200"
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _env_bool(name, default=False):
+    value = os.environ.get(name)
+    if not value:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+def _normalize_hosts(hosts):
+    if hosts is None:
+        hosts = os.environ.get("ES_HOSTS", DEFAULT_HOSTS)
+    if isinstance(hosts, str):
+        hosts = hosts.split(",")
+    return tuple(h.strip() for h in hosts if h.strip())
+
+
+def get_hosts(hosts=None):
+    """
+    返回连接地址列表，hosts 为 None 时读取环境变量 ES_HOSTS，没有设置时使用 DEFAULT_HOSTS
+    """
+    return list(_normalize_hosts(hosts))
+
+
+def client_options():
+    """
+    从环境变量读取客户端配置：
+
+    ES_CONNECTIONS_PER_NODE  每个节点的 keep-alive 连接池大小，默认 10
+    ES_REQUEST_TIMEOUT       单个请求超时秒数，默认 30
+    ES_MAX_RETRIES           最大重试次数，默认 3
+    ES_RETRY_ON_STATUS       需要重试的状态码，默认 429,503
+    ES_HTTP_COMPRESS         是否启用 gzip 压缩请求体，默认关闭
+    ES_ORJSON                是否使用 orjson 编解码 JSON（需要安装 orjson），默认关闭
+    """
+    retry_on_status = os.environ.get("ES_RETRY_ON_STATUS", "429,503")
+    options = {
+        "connections_per_node": _env_int("ES_CONNECTIONS_PER_NODE", 10),
+        "request_timeout": _env_int("ES_REQUEST_TIMEOUT", 30),
+        "max_retries": _env_int("ES_MAX_RETRIES", 3),
+        "retry_on_status": tuple(int(s) for s in retry_on_status.split(",") if s.strip()),
+        "retry_on_timeout": True,
+        "http_compress": _env_bool("ES_HTTP_COMPRESS"),
+    }
+    if _env_bool("ES_ORJSON"):
+        options["serializers"] = {"application/json": TimedJsonSerializer(use_orjson=True)}
+    return options
+
+
+def get_client(hosts=None):
+    """
+    返回共享的 Elasticsearch 客户端，同一进程内相同地址只创建一次
+
+    客户端是线程安全的，多个线程共用同一个连接池；fork 出的子进程会重新创建
+    """
+    key = (os.getpid(), _normalize_hosts(hosts))
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = Elasticsearch(list(key[1]), **client_options())
+                _clients[key] = client
+    return client
+
+
+def create_client(hosts=None, serializer=None, connections_per_node=None):
+    """
+    创建独立的 Elasticsearch 客户端（不进入共享缓存），serializer 用于替换默认的 JSON 序列化器，
+    connections_per_node 用于替换连接池大小（例如压测时按并发线程数设置）
+    """
+    options = client_options()
+    if connections_per_node is not None:
+        options["connections_per_node"] = connections_per_node
+    if serializer is not None:
+        # 兼容模式的 mimetype 会自动使用同一个序列化器
+        options["serializers"] = {"application/json": serializer}
+    return Elasticsearch(list(_normalize_hosts(hosts)), **options)
+
+
+def get_async_client(hosts=None):
+    """
+    创建使用相同配置的 AsyncElasticsearch 客户端，需要安装 aiohttp（pip install "elasticsearch[async]"），
+    没有安装时抛出 ImportError
+
+    异步客户端的连接池绑定在创建它的事件循环上，由调用方在同一个事件循环中复用，用完后 await client.close()
+    """
+    if aiohttp is None:
+        raise ImportError('AsyncElasticsearch 需要 aiohttp，请执行 pip install "elasticsearch[async]"')
+    return AsyncElasticsearch(list(_normalize_hosts(hosts)), **client_options())
+
+
+def get_http_session():
+    """
+    返回 requests.Session，用于直接调用 REST 接口，Session 会复用 keep-alive 连接
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    session.headers.update({'Content-Type': 'application/json'})
+    pool_size = _env_int("ES_CONNECTIONS_PER_NODE", 10)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
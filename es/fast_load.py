@@ -0,0 +1,94 @@
+import time
+from contextlib import contextmanager
+
+# 批量写入期间临时修改的索引设置
+LOAD_SETTINGS = {"index.refresh_interval": "-1", "index.number_of_replicas": 0}
+
+
+def _current_settings(es, index):
+    """
+    读取索引上显式设置的值，没有显式设置的返回 None，恢复时据此重置为默认值
+    """
+    response = es.indices.get_settings(index=index, name=",".join(LOAD_SETTINGS), flat_settings=True)
+    # index 可能是别名，返回结果以实际索引名为 key
+    settings = next(iter(response.values()), {}).get("settings", {})
+    return {key: settings.get(key) for key in LOAD_SETTINGS}
+
+
+def _target_status(es, index, replicas):
+    """
+    数据节点数不超过副本数时副本无法全部分配，只能等到 yellow
+    """
+    data_nodes = es.cluster.health(index=index)["number_of_data_nodes"]
+    return "green" if data_nodes > replicas else "yellow"
+
+
+@contextmanager
+def fast_load(es, index, max_num_segments=1, wait_for_status=None, timeout="60s"):
+    """
+    批量写入模式：写入前关闭自动 refresh 并去掉副本，结束后恢复原设置，
+    再 refresh、force merge 到 max_num_segments 个段，并等待集群恢复到 wait_for_status
+
+    :param wait_for_status: 为 None 时按数据节点数和恢复后的副本数选择 green 或 yellow
+    :return: 统计信息 dict，结束后包含 load_seconds（写入耗时）、finalize_seconds（恢复、合并、等待耗时）、
+             status（等待结束时的索引状态）和 timed_out（是否等待超时）
+    """
+    original = _current_settings(es, index)
+    es.indices.put_settings(index=index, settings=LOAD_SETTINGS)
+    print(f"索引 '{index}' 进入批量写入模式，原设置: {original}")
+
+    stats = {}
+    start_time = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats["load_seconds"] = time.perf_counter() - start_time
+        finalize_start = time.perf_counter()
+        # 即使写入失败也要恢复设置，否则索引会一直不可搜索、没有副本
+        es.indices.put_settings(index=index, settings=original)
+        print(f"索引 '{index}' 已恢复设置: {original}")
+
+    es.indices.refresh(index=index)
+    if max_num_segments:
+        es.options(request_timeout=3600).indices.forcemerge(index=index, max_num_segments=max_num_segments)
+    if wait_for_status is None:
+        # 没有显式设置副本数时默认为 1
+        wait_for_status = _target_status(es, index, int(original["index.number_of_replicas"] or 1))
+    # 等待超时时返回 408，不抛异常，状态和是否超时记录到统计信息中由调用方判断
+    health = es.options(ignore_status=408).cluster.health(index=index, wait_for_status=wait_for_status,
+                                                          timeout=timeout)
+    stats["status"] = health["status"]
+    stats["timed_out"] = health.get("timed_out", False)
+    if stats["timed_out"]:
+        print(f"警告: 等待索引 '{index}' 变为 {wait_for_status} 超时（{timeout}），当前状态: {health['status']}")
+    else:
+        print(f"索引 '{index}' 状态: {health['status']}")
+    stats["finalize_seconds"] = time.perf_counter() - finalize_start
+    print(f"批量写入耗时 {stats['load_seconds']:.2f} 秒，恢复设置、合并段和等待耗时 {stats['finalize_seconds']:.2f} 秒")
+
+
+def compare_load_modes(es, index, recreate, load, **fast_load_options):
+    """
+    分别以默认设置和批量写入模式加载同一份数据，输出两者的写入吞吐
+
+    :param recreate: 无参函数，删除并重新创建索引
+    :param load: 无参函数，执行写入并返回成功的文档数
+    :return: {"default": docs/s, "fast": docs/s}，只按写入步骤的耗时计算
+    """
+    results = {}
+
+    # 两种模式都只统计写入步骤的耗时，批量写入模式结束后的恢复设置、合并段和等待单独输出
+    recreate()
+    start_time = time.perf_counter()
+    docs = load()
+    results["default"] = docs / (time.perf_counter() - start_time)
+
+    recreate()
+    with fast_load(es, index, **fast_load_options) as stats:
+        docs = load()
+    results["fast"] = docs / stats["load_seconds"]
+
+    print(f"默认设置: {results['default']:.0f} docs/s，批量写入模式: {results['fast']:.0f} docs/s，"
+          f"提升 {results['fast'] / results['default']:.2f} 倍（批量写入模式另需 {stats['finalize_seconds']:.2f} 秒"
+          f"恢复设置、合并段和等待）")
+    return results
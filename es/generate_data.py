@@ -1,17 +1,19 @@
-import random
-from elasticsearch import Elasticsearch, helpers
+import argparse
+import time
 
-# 连接到 Elasticsearch
-es = Elasticsearch([{'host': 'localhost', 'port': 9200, 'scheme': 'http'}])
+from elasticsearch import helpers
 
-# 检查连接是否成功
-if not es.ping():
-    raise ValueError("Connection failed")
+from es.adaptive_bulk import adaptive_bulk
+from es.batch_data import iter_division_docs
+from es.es_client import get_client
+from es.fast_load import compare_load_modes, fast_load
+
+try:
+    import resource
+except ImportError:  # Windows 下没有 resource 模块
+    resource = None
 
-# 创建索引
 index_name = 'test_index'
-if es.indices.exists(index=index_name):
-    es.indices.delete(index=index_name)
 
 # 定义映射
 mapping = {
@@ -28,42 +30,90 @@ mapping = {
     }
 }
 
-es.indices.create(index=index_name, body=mapping)
 
-def get_random_array(array):
-    min_samples = 1
-    max_samples = len(array)
-    num_samples = random.randint(min_samples, max_samples)
-    return list(set(random.sample(array, num_samples)))
+# 创建索引
+def create_index(es):
+    if es.indices.exists(index=index_name):
+        es.indices.delete(index=index_name)
+    es.indices.create(index=index_name, body=mapping)
 
-# 生成 20 万个文档
-a_values = []
-for i in range(0,10):
-    a_values.append(f"{1000+i}")
 
+# 第一步：按块生成文档，只在迭代时构造 action
+def generate_actions(num_docs, seed=None, block_size=10_000):
+    for doc_id, source in iter_division_docs(num_docs, seed=seed, block_size=block_size):
+        yield {"_index": index_name, "_id": doc_id, "_source": source}
 
 
-b_values = []
-for j in range(0,10):
-    b_values.append(f"{2000+i}")
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # Linux 下 ru_maxrss 单位为 KB
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
 
-print("Data generation ongoing.")
 
-# 使用 bulk API 插入数据
-actions = []
-for i in range(200000):
-    doc = {
-        "_index": index_name,
-        "_id": i,
-        "_source": {
-            "division_desc": [
-                {"region": get_random_array(a_values), "repOffice": get_random_array(b_values)}
-            ]
-        }
-    }
-    actions.append(doc)
+# 第二、三步：streaming_bulk 按 chunk_size / max_chunk_bytes 切块并逐块发送，
+# 任意时刻内存中只有一个生成块和一个 bulk 请求
+def stream_insert(es, actions, chunk_size=1000, max_chunk_bytes=10 * 1024 * 1024, report_every=100_000):
+    success, failed = 0, 0
+    start_time = time.perf_counter()
+    for ok, item in helpers.streaming_bulk(es, actions, chunk_size=chunk_size, max_chunk_bytes=max_chunk_bytes,
+                                           raise_on_error=False):
+        if ok:
+            success += 1
+        else:
+            failed += 1
+        done = success + failed
+        if done % report_every == 0:
+            elapsed = time.perf_counter() - start_time
+            print(f"已写入 {done} 条, {done / elapsed:.0f} docs/s, 峰值内存 {peak_rss_mb()} MB")
+    return success, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m es.generate_data", description="生成 test_index 测试数据")
+    parser.add_argument("--docs", type=int, default=200_000, help="文档数量")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="每个 bulk 请求的文档数")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+    parser.add_argument("--no-fast-load", action="store_true", help="使用索引默认设置写入，不关闭 refresh 和副本")
+    parser.add_argument("--adaptive", action="store_true", help="使用自适应批次大小和并发数写入")
+    parser.add_argument("--trace", default=None, help="自适应写入时每个批次的吞吐记录 CSV 路径")
+    parser.add_argument("--compare", action="store_true", help="分别以默认设置和批量写入模式写入，对比吞吐")
+    args = parser.parse_args()
+
+    # 连接到 Elasticsearch
+    es = get_client()
+
+    # 检查连接是否成功
+    if not es.ping():
+        raise ValueError("Connection failed")
+
+    def insert():
+        actions = generate_actions(args.docs, seed=args.seed)
+        if args.adaptive:
+            return adaptive_bulk(es, actions, trace_path=args.trace)
+        return stream_insert(es, actions, chunk_size=args.chunk_size)
+
+    def load():
+        return insert()[0]
+
+    if args.compare:
+        compare_load_modes(es, index_name, lambda: create_index(es), load)
+        return
+
+    create_index(es)
+
+    print("Data generation ongoing.")
+    start_time = time.perf_counter()
+    if args.no_fast_load:
+        success, failed = insert()
+    else:
+        with fast_load(es, index_name):
+            success, failed = insert()
+    elapsed = time.perf_counter() - start_time
+
+    print(f"Data generation complete. {success} succeeded, {failed} failed, {elapsed:.2f}s, "
+          f"peak RSS {peak_rss_mb()} MB")
 
-# 批量插入数据
-helpers.bulk(es, actions)
 
-print("Data generation complete.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
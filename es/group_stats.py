@@ -0,0 +1,61 @@
+import numpy as np
+
+# 每个 group 需要累加的统计字段
+STAT_FIELDS = ("total_count", "count_age_gt_35", "count_birthday_after_2000")
+
+
+class GroupStatsReducer:
+    """
+    按 group 序号把各批次的统计结果累加到一个二维数组中
+
+    每个 group_id 第一次出现时分配一个序号，之后各批次只做一次向量化的加法
+    """
+
+    def __init__(self, fields=STAT_FIELDS, capacity=1024):
+        self.fields = tuple(fields)
+        self.ordinals = {}
+        self.group_ids = []
+        self.group_names = []
+        self.counts = np.zeros((capacity, len(self.fields)), dtype=np.int64)
+
+    def __len__(self):
+        return len(self.group_ids)
+
+    def _ordinal(self, group_id, group_name):
+        ordinal = self.ordinals.get(group_id)
+        if ordinal is None:
+            ordinal = len(self.group_ids)
+            self.ordinals[group_id] = ordinal
+            self.group_ids.append(group_id)
+            self.group_names.append(group_name)
+        else:
+            self.group_names[ordinal] = group_name
+        return ordinal
+
+    def add_rows(self, rows):
+        """
+        合并一个批次的结果行，每行包含 group_id、group_name 和 STAT_FIELDS 中的字段
+        """
+        ordinals = []
+        values = []
+        for row in rows:
+            ordinals.append(self._ordinal(row["group_id"], row["group_name"]))
+            values.append([row[f] for f in self.fields])
+        if not ordinals:
+            return
+
+        if len(self.group_ids) > len(self.counts):
+            grown = np.zeros((max(len(self.group_ids), len(self.counts) * 2), len(self.fields)), dtype=np.int64)
+            grown[:len(self.counts)] = self.counts
+            self.counts = grown
+        np.add.at(self.counts, np.asarray(ordinals), np.asarray(values, dtype=np.int64))
+
+    def to_dict(self):
+        """
+        转换成 {group_id: {group_name, total_count, ...}} 的形式，用于保存结果
+        """
+        counts = self.counts[:len(self.group_ids)].tolist()
+        return {
+            group_id: {"group_name": group_name, **dict(zip(self.fields, row))}
+            for group_id, group_name, row in zip(self.group_ids, self.group_names, counts)
+        }
@@ -0,0 +1,221 @@
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# 查询时返回的字段
+SOURCE_FIELDS = ["id", "name", "age"]
+
+
+def murmur3_x86_32(data, seed=0):
+    """
+    murmur3 x86 32 位哈希，返回有符号 int，与 Lucene StringHelper.murmurhash3_x86_32 一致
+    """
+    c1, c2 = 0xcc9e2d51, 0x1b873593
+    h = seed & 0xffffffff
+    length = len(data)
+    rounded_end = length & ~3
+
+    for i in range(0, rounded_end, 4):
+        k = int.from_bytes(data[i:i + 4], "little")
+        k = (k * c1) & 0xffffffff
+        k = ((k << 15) | (k >> 17)) & 0xffffffff
+        k = (k * c2) & 0xffffffff
+        h ^= k
+        h = ((h << 13) | (h >> 19)) & 0xffffffff
+        h = (h * 5 + 0xe6546b64) & 0xffffffff
+
+    tail = length & 3
+    if tail:
+        k = int.from_bytes(data[rounded_end:], "little")
+        k = (k * c1) & 0xffffffff
+        k = ((k << 15) | (k >> 17)) & 0xffffffff
+        k = (k * c2) & 0xffffffff
+        h ^= k
+
+    h ^= length
+    h ^= h >> 16
+    h = (h * 0x85ebca6b) & 0xffffffff
+    h ^= h >> 13
+    h = (h * 0xc2b2ae35) & 0xffffffff
+    h ^= h >> 16
+    return h - (1 << 32) if h & 0x80000000 else h
+
+
+def shard_for_id(doc_id, routing_num_shards, num_shards):
+    """
+    按 Elasticsearch 默认路由规则计算文档所在的分片：
+    floorMod(murmur3(_id 的 UTF-16 字节), routing_num_shards) / (routing_num_shards / num_shards)
+    """
+    h = murmur3_x86_32(str(doc_id).encode("utf-16-le"))
+    return (h % routing_num_shards) // (routing_num_shards // num_shards)
+
+
+def get_routing_shards(es, index):
+    """
+    从集群元数据中读取 (routing_num_shards, number_of_shards)
+    """
+    meta = es.cluster.state(metric="metadata", index=index)["metadata"]["indices"][index]
+    return int(meta["routing_num_shards"]), int(meta["settings"]["index"]["number_of_shards"])
+
+
+def _batches(ids, batch_size):
+    for start in range(0, len(ids), batch_size):
+        yield ids[start:start + batch_size]
+
+
+# 响应精简方式：
+# source       返回 _source 中的字段（默认）
+# filter_path  同上，但响应只保留 took 和命中文档，去掉 _index / _score 等元数据
+# docvalue     不读取 _source，从 doc values 取字段（字段需要开启 doc_values，例如 keyword / 数值）
+# stored       不读取 _source，返回单独存储的字段（mapping 中需要 "store": true）
+LOOKUP_MODES = ("source", "filter_path", "docvalue", "stored")
+
+
+def lookup_body(query, size, mode="source"):
+    """
+    返回 (查询 body, filter_path)
+    """
+    body = {"query": query, "size": size}
+    if mode in ("source", "filter_path"):
+        body["_source"] = SOURCE_FIELDS
+    elif mode == "docvalue":
+        body["_source"] = False
+        body["docvalue_fields"] = SOURCE_FIELDS
+    elif mode == "stored":
+        body["_source"] = False
+        body["stored_fields"] = SOURCE_FIELDS
+    else:
+        raise ValueError(f"未知的响应精简方式: {mode}")
+
+    if mode == "source":
+        return body, None
+    hit_fields = "_source" if mode == "filter_path" else "fields"
+    return body, f"took,hits.hits._id,hits.hits.{hit_fields}"
+
+
+def usable_modes(es, index, modes=LOOKUP_MODES):
+    """
+    检查 SOURCE_FIELDS 的 mapping，返回 modes 中在该索引上可用的响应精简方式，不可用的输出原因后跳过
+
+    docvalue 要求每个字段都有 doc values（field_caps 中 aggregatable，text 字段不满足），
+    stored 要求每个字段都设置了 "store": true，否则返回的 fields 为空，与其他方式的字节数不可比
+    """
+    requirements = {"docvalue": "doc values", "stored": '"store": true'}
+    usable = []
+    for mode in modes:
+        if mode == "docvalue":
+            caps = es.field_caps(index=index, fields=SOURCE_FIELDS)["fields"]
+            missing = [field for field in SOURCE_FIELDS
+                       if not caps.get(field) or not all(c.get("aggregatable") for c in caps[field].values())]
+        elif mode == "stored":
+            mappings = es.indices.get_mapping(index=index)
+            missing = [field for field in SOURCE_FIELDS
+                       if not all(m["mappings"].get("properties", {}).get(field, {}).get("store")
+                                  for m in mappings.values())]
+        else:
+            missing = []
+        if missing:
+            print(f"跳过 {mode}：索引 '{index}' 的字段 {missing} 不支持（需要 {requirements[mode]}）")
+        else:
+            usable.append(mode)
+    return usable
+
+
+def _count_hits(response):
+    # 使用 filter_path 且没有命中时，响应中没有 hits
+    return len(response.get("hits", {}).get("hits", []))
+
+
+def lookup_terms(es, index, batch, mode="source"):
+    body, filter_path = lookup_body({"terms": {"id": batch}}, len(batch), mode)
+    return _count_hits(es.search(index=index, body=body, filter_path=filter_path))
+
+
+def lookup_ids(es, index, batch, mode="source"):
+    body, filter_path = lookup_body({"ids": {"values": batch}}, len(batch), mode)
+    return _count_hits(es.search(index=index, body=body, filter_path=filter_path))
+
+
+def lookup_mget(es, index, batch, mode="source"):
+    # mget 不支持 docvalue_fields，非默认方式下只精简响应
+    filter_path = None if mode == "source" else "docs.found,docs._id,docs._source"
+    response = es.mget(index=index, ids=batch, _source_includes=SOURCE_FIELDS, filter_path=filter_path)
+    return sum(1 for doc in response.get("docs", []) if doc.get("found"))
+
+
+def run_strategy(es, index, strategy, ids, batch_size, concurrency=1, routing=None, mode="source"):
+    """
+    用指定策略查询一组 ID，返回 (耗时秒数, 找到的文档数)
+
+    :param strategy: terms / ids / mget / routed_mget
+    :param concurrency: 同时在途的请求数，所有策略使用相同的值，比较结果只反映查询方式的差异
+    :param routing: routed_mget 使用的 (routing_num_shards, number_of_shards)
+    :param mode: 响应精简方式，见 LOOKUP_MODES
+    """
+    if strategy == "routed_mget":
+        routing_num_shards, num_shards = routing or get_routing_shards(es, index)
+        # 按分片分组，每个 mget 请求只落到一个分片上
+        by_shard = defaultdict(list)
+        for doc_id in ids:
+            by_shard[shard_for_id(doc_id, routing_num_shards, num_shards)].append(doc_id)
+        batches = [batch for shard_ids in by_shard.values() for batch in _batches(shard_ids, batch_size)]
+        lookup = lookup_mget
+    else:
+        batches = list(_batches(ids, batch_size))
+        lookup = {"terms": lookup_terms, "ids": lookup_ids, "mget": lookup_mget}[strategy]
+
+    start_time = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            found = sum(executor.map(lambda batch: lookup(es, index, batch, mode), batches))
+    else:
+        found = sum(lookup(es, index, batch, mode) for batch in batches)
+    return time.perf_counter() - start_time, found
+
+
+def sweep_strategies(es, index, all_ids, set_sizes=(100, 1000, 10_000, 100_000),
+                     batch_sizes=(100, 1000, 10_000), strategies=("terms", "ids", "mget", "routed_mget"),
+                     concurrency_levels=None, repeat=3):
+    """
+    对不同的 ID 数量、批次大小和并发数比较各查询策略，打印结果表并返回每个 ID 数量下最快的
+    (策略, 批次大小, 并发数) 组合
+
+    要求文档的 _id 与 id 字段相同，否则 ids / mget 查询找不到文档。
+    每个并发数下所有策略都以相同的设置执行
+
+    :param concurrency_levels: 同时在途的请求数列表，为 None 时使用 (1, 主分片数)，
+                               按分片路由的 mget 在并发数等于分片数时才能各分片并行查询
+    """
+    routing = get_routing_shards(es, index)
+    if concurrency_levels is None:
+        concurrency_levels = sorted({1, routing[1]})
+    rows = []
+    best = {}
+    for set_size in set_sizes:
+        ids = all_ids[:set_size]
+        for batch_size in batch_sizes:
+            if batch_size > len(ids) and batch_size != min(batch_sizes):
+                continue
+            for concurrency in concurrency_levels:
+                for strategy in strategies:
+                    # 取多次运行的最小值，减少偶然抖动的影响
+                    runs = [run_strategy(es, index, strategy, ids, batch_size, concurrency, routing)
+                            for _ in range(repeat)]
+                    seconds = min(r[0] for r in runs)
+                    row = {"ids": len(ids), "batch_size": batch_size, "strategy": strategy,
+                           "concurrency": concurrency, "ms": seconds * 1000, "found": runs[0][1]}
+                    rows.append(row)
+                    if len(ids) not in best or row["ms"] < best[len(ids)]["ms"]:
+                        best[len(ids)] = row
+
+    print(f"{'ids':>8} {'batch':>7} {'strategy':<12} {'conc':>5} {'ms':>10} {'found':>8}")
+    for row in rows:
+        marker = " *" if best[row["ids"]] is row else ""
+        print(f"{row['ids']:>8} {row['batch_size']:>7} {row['strategy']:<12} {row['concurrency']:>5} "
+              f"{row['ms']:>10.1f} {row['found']:>8}{marker}")
+
+    print("\n每个 ID 数量下最快的组合:")
+    for set_size, row in best.items():
+        print(f"  {set_size:>8} 个ID: {row['strategy']} (batch size {row['batch_size']}, "
+              f"concurrency {row['concurrency']}), {row['ms']:.1f} ms")
+    return best
@@ -0,0 +1,94 @@
+import os
+import uuid
+from itertools import islice
+
+import numpy as np
+
+from es.batch_data import uuid_strings
+
+# 每个 UUID 占用的字节数
+UUID_BYTES = 16
+
+
+class UuidStore:
+    """
+    以 16 字节二进制形式紧凑存储 UUID 字符串
+
+    数据保存在 (n, 16) 的 uint8 数组中，指定 spill_path 时使用内存映射文件，
+    batches 返回的是底层数组的切片视图，不会复制数据
+    """
+
+    def __init__(self, capacity=1 << 16, spill_path=None):
+        self.spill_path = spill_path
+        self._size = 0
+        self._buf = self._allocate(max(capacity, 1))
+
+    def _allocate(self, capacity):
+        if self.spill_path is None:
+            return np.empty((capacity, UUID_BYTES), dtype=np.uint8)
+        # 内存映射文件扩容：先扩展文件，再重新映射
+        mode = "r+" if os.path.exists(self.spill_path) and self._size else "w+"
+        if mode == "r+":
+            self._buf.flush()
+            with open(self.spill_path, "r+b") as f:
+                f.truncate(capacity * UUID_BYTES)
+        return np.memmap(self.spill_path, dtype=np.uint8, mode=mode, shape=(capacity, UUID_BYTES))
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        if needed <= len(self._buf):
+            return
+        capacity = max(needed, len(self._buf) * 2)
+        if self.spill_path is None:
+            grown = self._allocate(capacity)
+            grown[:self._size] = self._buf[:self._size]
+            self._buf = grown
+        else:
+            self._buf = self._allocate(capacity)
+
+    def __len__(self):
+        return self._size
+
+    def extend(self, ids, chunk=4096):
+        """
+        追加 UUID 字符串（带或不带连字符），非 UUID 格式会抛出 ValueError，出错的块不会写入
+
+        每个 ID 单独校验，只检查整块的总长度时一个短 ID 加一个长 ID 会让后面的 UUID 全部错位
+        """
+        it = iter(ids)
+        while True:
+            block = list(islice(it, chunk))
+            if not block:
+                return
+            try:
+                packed = b"".join(uuid.UUID(i).bytes for i in block)
+            except (ValueError, TypeError, AttributeError):
+                raise ValueError("UuidStore 只能存储 UUID 格式的 ID") from None
+            raw = np.frombuffer(packed, dtype=np.uint8)
+            self._reserve(len(block))
+            self._buf[self._size:self._size + len(block)] = raw.reshape(-1, UUID_BYTES)
+            self._size += len(block)
+
+    def view(self):
+        """
+        返回已写入部分的视图
+        """
+        return self._buf[:self._size]
+
+    def batches(self, batch_size):
+        """
+        按 batch_size 切分，返回零拷贝的切片视图
+        """
+        data = self.view()
+        for start in range(0, self._size, batch_size):
+            yield data[start:start + batch_size]
+
+    def nbytes(self):
+        return self._size * UUID_BYTES
+
+    @staticmethod
+    def to_strings(batch):
+        """
+        把一个批次转换回 UUID 字符串，用于构造查询
+        """
+        return uuid_strings(np.ascontiguousarray(batch))
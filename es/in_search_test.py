@@ -1,11 +1,21 @@
-from elasticsearch import Elasticsearch
+import asyncio
 import time
 import random
 import string
+from concurrent.futures import ThreadPoolExecutor
 from itertools import islice  # 导入islice
 
+from elasticsearch import ApiError
+
+from es.batch_planner import BatchPlanner, iter_planned, max_batch_size
+from es.bench_harness import BenchmarkHarness
+from es.es_client import create_client, get_async_client, get_client
+from es.id_lookup import LOOKUP_MODES, lookup_body, sweep_strategies, usable_modes
+from es.latency_stats import summarize
+from es.timed_serializer import TimedJsonSerializer, orjson
+
 # 初始化Elasticsearch客户端
-es = Elasticsearch("http://localhost:9200")
+es = get_client()
 
 
 # 生成4000个随机ID
@@ -51,6 +61,7 @@ def test_single_query(ids):
                     "id": ids
                 }
             },
+            "size": len(ids),
             "_source": ["id","name","age"]
         }
     )
@@ -72,6 +83,7 @@ def test_single_only_id_query(ids):
                     "id": ids
                 }
             },
+            "size": len(ids),
             "_source": ["id"]
         }
     )
@@ -98,6 +110,7 @@ def test_batched_query(ids, batch_size=1024):
                         "id": batch
                     }
                 },
+                "size": len(batch),
                 "_source": ["id", "name", "age"]
             }
         )
@@ -113,6 +126,179 @@ def test_batched_query(ids, batch_size=1024):
     return total_time
 
 
+# 批次大小由 BatchPlanner 按实测延迟选择，goal 为 throughput（吞吐最高）或 tail（尾延迟最低）
+def test_planned_batched_query(ids, goal="throughput", concurrency=1, rounds=10, planner=None):
+    planner = planner or BatchPlanner(min(max_batch_size(es, "my_index"), len(ids)), goal=goal)
+
+    def run_batch(batch):
+        response = es.search(
+            index="my_index",
+            body={
+                "query": {
+                    "terms": {
+                        "id": batch
+                    }
+                },
+                "size": len(batch),
+                "_source": ["id", "name", "age"]
+            }
+        )
+        return len(response["hits"]["hits"])
+
+    start_time = time.perf_counter()
+    found = 0
+    # 同一组ID重复查询多轮，让 planner 有足够的样本
+    for _ in range(rounds):
+        found += sum(iter_planned(planner, ids, run_batch, concurrency=concurrency))
+    elapsed_time = time.perf_counter() - start_time
+    print(f"Planned batched query for {len(ids)} IDs x {rounds} rounds took {elapsed_time:.4f} seconds, found {found}")
+    return planner.report()
+
+
+# 使用线程池并发执行分批查询，最多 concurrency 个批次同时在途，没有安装 aiohttp 时代替异步版本
+def test_batched_query_threaded(ids, batch_size=1024, concurrency=4):
+    def run_batch(batch):
+        start_time = time.perf_counter()
+        es.search(
+            index="my_index",
+            body={
+                "query": {
+                    "terms": {
+                        "id": batch
+                    }
+                },
+                "size": len(batch),
+                "_source": ["id", "name", "age"]
+            }
+        )
+        return (time.perf_counter() - start_time) * 1000
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(run_batch, batched(ids, batch_size)))
+    wall_time = time.perf_counter() - start_time
+
+    stats = summarize(latencies)
+    print(
+        f"Threaded batched query for {len(ids)} IDs (batch size: {batch_size}, concurrency: {concurrency}) "
+        f"took {wall_time:.4f} seconds end-to-end, per batch p50/p95/p99: "
+        f"{stats['p50']:.1f}/{stats['p95']:.1f}/{stats['p99']:.1f} ms over {stats['count']} batches")
+    return wall_time, stats
+
+
+# 使用 AsyncElasticsearch 并发执行分批查询，最多 concurrency 个批次同时在途
+# 需要安装 aiohttp（pip install "elasticsearch[async]"），没有安装时改用线程池版本
+async def test_batched_query_async(ids, batch_size=1024, concurrency=4):
+    try:
+        async_es = get_async_client()
+    except ImportError as e:
+        print(f"{e}，改用线程池并发查询")
+        return await asyncio.to_thread(test_batched_query_threaded, ids, batch_size, concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def run_batch(batch):
+        async with semaphore:
+            start_time = time.perf_counter()
+            await async_es.search(
+                index="my_index",
+                body={
+                    "query": {
+                        "terms": {
+                            "id": batch
+                        }
+                    },
+                    "size": len(batch),
+                    "_source": ["id", "name", "age"]
+                }
+            )
+            latencies.append((time.perf_counter() - start_time) * 1000)
+
+    start_time = time.perf_counter()
+    try:
+        await asyncio.gather(*(run_batch(batch) for batch in batched(ids, batch_size)))
+    finally:
+        await async_es.close()
+    wall_time = time.perf_counter() - start_time
+
+    stats = summarize(latencies)
+    print(
+        f"Async batched query for {len(ids)} IDs (batch size: {batch_size}, concurrency: {concurrency}) "
+        f"took {wall_time:.4f} seconds end-to-end, per batch p50/p95/p99: "
+        f"{stats['p50']:.1f}/{stats['p95']:.1f}/{stats['p99']:.1f} ms over {stats['count']} batches")
+    return wall_time, stats
+
+
+# 预热后多次测量两种 _source 设置下的查询延迟
+def benchmark_lookups(ids, warmup=5, iterations=50, output=None):
+    def lookup(source):
+        return es.search(
+            index="my_index",
+            body={
+                "query": {
+                    "terms": {
+                        "id": ids
+                    }
+                },
+                "size": len(ids),
+                "_source": source
+            }
+        )
+
+    harness = BenchmarkHarness(warmup=warmup, iterations=iterations)
+    harness.register("terms_id_name_age", lambda: lookup(["id", "name", "age"]))
+    harness.register("terms_only_id", lambda: lookup(["id"]))
+    results = harness.run()
+    harness.report(results)
+    if output:
+        harness.save_json(results, output)
+    return results
+
+
+# 分别统计服务端 took、响应体字节数、JSON 解码耗时和其余客户端耗时（网络传输、构建请求等），
+# 对比不同的响应精简方式以及 json / orjson；mapping 不支持的方式先跳过，执行出错的方式输出错误后继续
+def benchmark_response_slimming(ids, modes=LOOKUP_MODES, warmup=5, iterations=50):
+    modes = usable_modes(es, "my_index", modes)
+    libraries = [False, True] if orjson is not None else [False]
+    results = {}
+    for use_orjson in libraries:
+        serializer = TimedJsonSerializer(use_orjson=use_orjson)
+        client = create_client(serializer=serializer)
+        for mode in modes:
+            body, filter_path = lookup_body({"terms": {"id": ids}}, len(ids), mode)
+            samples = {"took_ms": [], "wall_ms": [], "decode_ms": [], "bytes": [], "other_ms": []}
+            try:
+                client.search(index="my_index", body=body, filter_path=filter_path)
+            except ApiError as e:
+                print(f"{mode}/{serializer.library} 查询失败，跳过: {e}")
+                continue
+            for i in range(warmup + iterations):
+                start = time.perf_counter()
+                response = client.search(index="my_index", body=body, filter_path=filter_path)
+                wall_ms = (time.perf_counter() - start) * 1000
+                if i < warmup:
+                    continue
+                size, decode_seconds = serializer.last_decode()
+                samples["took_ms"].append(response["took"])
+                samples["wall_ms"].append(wall_ms)
+                samples["decode_ms"].append(decode_seconds * 1000)
+                samples["bytes"].append(size)
+                samples["other_ms"].append(wall_ms - response["took"] - decode_seconds * 1000)
+            results[f"{mode}/{serializer.library}"] = {name: summarize(values) for name, values in samples.items()}
+        client.close()
+
+    print(f"{'variant':<22} {'took p50':>9} {'wall p50':>9} {'decode p50':>11} {'other p50':>10} {'bytes':>10}")
+    for name, r in results.items():
+        print(f"{name:<22} {r['took_ms']['p50']:>7.1f}ms {r['wall_ms']['p50']:>7.1f}ms {r['decode_ms']['p50']:>9.2f}ms "
+              f"{r['other_ms']['p50']:>8.1f}ms {r['bytes']['mean']:>10.0f}")
+    return results
+
+
+# 比较 terms / ids / mget / 按分片路由的 mget 在不同ID数量、批次大小和并发数下的耗时
+def compare_lookup_strategies(count=100_000, concurrency_levels=None):
+    return sweep_strategies(es, "my_index", generate_fixed_ids(count=count), concurrency_levels=concurrency_levels)
+
+
 # 执行测试
 if __name__ == "__main__":
     # 测试单次查询4000个ID
@@ -122,9 +308,26 @@ if __name__ == "__main__":
     single_only_id_query_time = test_single_only_id_query(test_ids)
 
 
+    # # 预热后多次测量，输出延迟百分位数
+    # benchmark_lookups(test_ids, output="in_search_bench.json")
+
+    # # 对比 _source / filter_path / docvalue_fields / stored_fields 以及 json / orjson 的客户端耗时构成
+    # benchmark_response_slimming(test_ids)
+
     # # 测试分批查询4000个ID（每次1024个）
     # batched_query_time = test_batched_query(test_ids, batch_size=1024)
 
+    # # 自动选择批次大小：吞吐优先或尾延迟优先
+    # best_batch_size = test_planned_batched_query(test_ids, goal="throughput")
+    # best_batch_size = test_planned_batched_query(test_ids, goal="tail")
+
+    # # 测试并发分批查询4000个ID（每次1024个，最多4个批次同时在途），异步版本需要 aiohttp
+    # threaded_wall_time, threaded_stats = test_batched_query_threaded(test_ids, batch_size=1024, concurrency=4)
+    # async_wall_time, async_stats = asyncio.run(test_batched_query_async(test_ids, batch_size=1024, concurrency=4))
+
+    # # 比较 terms / ids / mget / 按分片路由的 mget 在不同ID数量、批次大小和并发数下的耗时
+    # best_strategies = compare_lookup_strategies(count=100_000)
+
     # 比较两种方法的总时间
     # print(f"Total time for single query: {single_query_time:.4f} seconds")
     # print(f"Total time for batched query: {batched_query_time:.4f} seconds")
\ No newline at end of file
@@ -0,0 +1,27 @@
+import math
+
+
+def percentile(sorted_samples, p):
+    """
+    对已排序的样本做线性插值求百分位数，p 取值 0-100
+    """
+    if not sorted_samples:
+        return 0.0
+    rank = (len(sorted_samples) - 1) * p / 100
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return sorted_samples[low]
+    return sorted_samples[low] + (sorted_samples[high] - sorted_samples[low]) * (rank - low)
+
+
+def summarize(samples, percentiles=(50, 95, 99)):
+    """
+    计算一组延迟样本的统计值，返回 {"count", "mean", "p50", ..., "max"}
+    """
+    ordered = sorted(samples)
+    summary = {"count": len(ordered), "mean": sum(ordered) / len(ordered) if ordered else 0.0}
+    for p in percentiles:
+        summary[f"p{p:g}"] = percentile(ordered, p)
+    summary["max"] = ordered[-1] if ordered else 0.0
+    return summary
@@ -1,16 +1,84 @@
 import time
 import json
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 
 from datetime import datetime, timedelta
-from elasticsearch import Elasticsearch
 
+from es.bench_harness import BenchmarkHarness
+from es.es_client import get_client
+from es.like_test.generate_like_data import name_positions
+from es.load_generator import LOAD_WORKERS, load_client, sweep_concurrency, sweep_rates
+from es.query_profile import compare_profiles
+from es.script_registry import ScriptRegistry, track_script_stats
 
-def test_similarity_query(es_host, index_name, name, age, birthday):
+
+# 姓名、年龄、生日相似度打分脚本
+NAME_SCORE_SCRIPT = """
+    // 名称相似度评分 - 修复类型转换
+    if (doc['name'].size() == 0) {
+        return 1;
+    }
+
+    String inputName = params.input_name;
+    String docName = doc['name'].value;
+
+    // 修复：显式类型转换
+    int common = 0;
+    int minLen = (int) Math.min(inputName.length(), docName.length());
+    for (int i = 0; i < minLen; i++) {
+        if (inputName.charAt(i) == docName.charAt(i)) {
+            common++;
+        }
+    }
+
+    if (common > 5) return 6;
+    else if (common > 2) return 3;
+    else return 1;
+"""
+
+AGE_SCORE_SCRIPT = """
+    // 年龄相似度评分
+    if (doc['age'].size() == 0) {
+        return 1;
+    }
+
+    int inputAge = params.input_age;
+    int docAge = (int) doc['age'].value;
+    int diff = (int) Math.abs(inputAge - docAge);
+
+    if (diff <= 5) return 5;
+    else if (diff <= 3) return 2;
+    else return 1;
+"""
+
+BIRTHDAY_SCORE_SCRIPT = """
+    // 生日相似度评分 - 使用推荐方法
+    if (doc['birthday'].size() == 0) {
+        return 1;
+    }
+
+    long inputBirthday = params.input_birthday;
+    long docBirthday = doc['birthday'].value.toInstant().toEpochMilli();
+    long diff = (long) Math.abs(docBirthday - inputBirthday);
+    long daysDiff = diff / (24 * 60 * 60 * 1000);
+
+    if (daysDiff < 1) return 5;
+    else if (daysDiff < 3) return 4;
+    else return 1;
+"""
+
+scripts = ScriptRegistry()
+scripts.register("similarity_name", NAME_SCORE_SCRIPT)
+scripts.register("similarity_age", AGE_SCORE_SCRIPT)
+scripts.register("similarity_birthday", BIRTHDAY_SCORE_SCRIPT)
+
+
+def build_similarity_query(name, age, birthday):
     """
-    执行相似度查询并测量性能
+    构建姓名、年龄、生日相似度的 function_score 查询
     """
-    es = Elasticsearch([es_host])
-
     # 将生日转换为时间戳（毫秒）
     birthday_dt = datetime.strptime(birthday, "%Y-%m-%d")
     birthday_ts = int(birthday_dt.timestamp() * 1000)
@@ -24,28 +92,7 @@ def test_similarity_query(es_host, index_name, name, age, birthday):
                     {
                         "script_score": {
                             "script": {
-                                "source": """
-                                    // 名称相似度评分 - 修复类型转换
-                                    if (doc['name'].size() == 0) {
-                                        return 1;
-                                    }
-
-                                    String inputName = params.input_name;
-                                    String docName = doc['name'].value;
-
-                                    // 修复：显式类型转换
-                                    int common = 0;
-                                    int minLen = (int) Math.min(inputName.length(), docName.length());
-                                    for (int i = 0; i < minLen; i++) {
-                                        if (inputName.charAt(i) == docName.charAt(i)) {
-                                            common++;
-                                        }
-                                    }
-
-                                    if (common > 5) return 6;
-                                    else if (common > 2) return 3;
-                                    else return 1;
-                                """,
+                                "source": NAME_SCORE_SCRIPT,
                                 "params": {
                                     "input_name": name
                                 }
@@ -55,20 +102,7 @@ def test_similarity_query(es_host, index_name, name, age, birthday):
                     {
                         "script_score": {
                             "script": {
-                                "source": """
-                                    // 年龄相似度评分
-                                    if (doc['age'].size() == 0) {
-                                        return 1;
-                                    }
-
-                                    int inputAge = params.input_age;
-                                    int docAge = (int) doc['age'].value;
-                                    int diff = (int) Math.abs(inputAge - docAge);
-
-                                    if (diff <= 5) return 5;
-                                    else if (diff <= 3) return 2;
-                                    else return 1;
-                                """,
+                                "source": AGE_SCORE_SCRIPT,
                                 "params": {
                                     "input_age": age
                                 }
@@ -79,21 +113,7 @@ def test_similarity_query(es_host, index_name, name, age, birthday):
                     {
                         "script_score": {
                             "script": {
-                                "source": """
-                                    // 生日相似度评分 - 使用推荐方法
-                                    if (doc['birthday'].size() == 0) {
-                                        return 1;
-                                    }
-
-                                    long inputBirthday = params.input_birthday;
-                                    long docBirthday = doc['birthday'].value.toInstant().toEpochMilli();
-                                    long diff = (long) Math.abs(docBirthday - inputBirthday);
-                                    long daysDiff = diff / (24 * 60 * 60 * 1000);
-
-                                    if (daysDiff < 1) return 5;
-                                    else if (daysDiff < 3) return 4;
-                                    else return 1;
-                                """,
+                                "source": BIRTHDAY_SCORE_SCRIPT,
                                 "params": {
                                     "input_birthday": birthday_ts
                                 }
@@ -114,6 +134,177 @@ def test_similarity_query(es_host, index_name, name, age, birthday):
         ],
         "size": 10
     }
+    return query
+
+
+def _birthday_window(birthday_ts, days):
+    # 脚本中 daysDiff < days 等价于 |docBirthday - inputBirthday| < days * 一天的毫秒数
+    day_ms = 24 * 60 * 60 * 1000
+    return {"range": {"birthday": {"gt": birthday_ts - days * day_ms, "lt": birthday_ts + days * day_ms,
+                                   "format": "epoch_millis"}}}
+
+
+def build_native_similarity_query(name, age, birthday):
+    """
+    与 build_similarity_query 打分完全一致的原生查询，不使用脚本
+
+    每个打分项拆成“基础分 + 满足条件时的加分”：
+    姓名用 name_pos 上的 term 查询配合 minimum_should_match 统计相同位置的字符数，
+    年龄和生日直接在已有字段上用 range 判断差值窗口
+    """
+    # 与脚本版本使用相同的时间戳，保证生日窗口的边界一致
+    birthday_dt = datetime.strptime(birthday, "%Y-%m-%d")
+    birthday_ts = int(birthday_dt.timestamp() * 1000)
+
+    def common_at_least(n):
+        return {"bool": {"should": [{"term": {"name_pos": t}} for t in positions], "minimum_should_match": n}}
+
+    positions = name_positions(name)
+    functions = [
+        # 三个打分项的基础分各为 1
+        {"weight": 3},
+        # 年龄差 <= 5: 1 -> 5
+        {"filter": {"range": {"age": {"gte": age - 5, "lte": age + 5}}}, "weight": 4},
+        # 生日相差 < 3 天: 1 -> 4，< 1 天: 4 -> 5
+        {"filter": _birthday_window(birthday_ts, 3), "weight": 3},
+        {"filter": _birthday_window(birthday_ts, 1), "weight": 1}
+    ]
+    # 相同位置字符数 > 2: 1 -> 3，> 5: 3 -> 6
+    if len(positions) >= 3:
+        functions.append({"filter": common_at_least(3), "weight": 2})
+    if len(positions) >= 6:
+        functions.append({"filter": common_at_least(6), "weight": 3})
+
+    return {
+        "query": {
+            "function_score": {
+                "query": {"match_all": {}},
+                "functions": functions,
+                "score_mode": "sum",
+                "boost_mode": "replace"
+            }
+        },
+        "sort": [
+            {
+                "_score": {
+                    "order": "desc"
+                }
+            }
+        ],
+        "size": 10
+    }
+
+
+def build_rescore_similarity_query(name, age, birthday, window_size=500):
+    """
+    两阶段查询：先用索引字段上的过滤条件取出候选集（年龄窗口、生日窗口、姓名首字前缀），
+    只对得分最高的 window_size 个候选执行脚本精确打分
+    """
+    birthday_dt = datetime.strptime(birthday, "%Y-%m-%d")
+    birthday_ts = int(birthday_dt.timestamp() * 1000)
+
+    # 第一阶段的分数按各条件在精确打分中的加分设置，让窗口优先保留可能得高分的候选
+    candidates = [
+        {"constant_score": {"filter": {"range": {"age": {"gte": age - 5, "lte": age + 5}}}, "boost": 4}},
+        {"constant_score": {"filter": _birthday_window(birthday_ts, 3), "boost": 3}},
+        {"constant_score": {"filter": _birthday_window(birthday_ts, 1), "boost": 1}},
+        {"constant_score": {"filter": {"prefix": {"name": name[:1]}}, "boost": 2}}
+    ]
+    exact = build_similarity_query(name, age, birthday)["query"]
+
+    return {
+        "query": {"bool": {"should": candidates, "minimum_should_match": 1}},
+        "rescore": {
+            "window_size": window_size,
+            "query": {
+                "rescore_query": exact,
+                "query_weight": 0,
+                "rescore_query_weight": 1
+            }
+        },
+        "size": 10
+    }
+
+
+def recall_at_k(exact_hits, approx_hits, k=10):
+    """
+    返回 (按文档的召回率, 按分数的召回率)
+
+    分数相同的文档排序不固定，按分数的召回率把同分文档视为等价
+    """
+    exact = exact_hits[:k]
+    approx = approx_hits[:k]
+    if not exact:
+        return 1.0, 1.0
+    exact_ids = {hit["_id"] for hit in exact}
+    id_recall = sum(1 for hit in approx if hit["_id"] in exact_ids) / len(exact)
+
+    remaining = Counter(hit["_score"] for hit in exact)
+    matched = 0
+    for hit in approx:
+        if remaining[hit["_score"]] > 0:
+            remaining[hit["_score"]] -= 1
+            matched += 1
+    return id_recall, matched / len(exact)
+
+
+def evaluate_rescore_windows(es_host, index_name, name, age, birthday, windows=(50, 100, 500, 1000, 5000)):
+    """
+    以全量脚本打分的结果为基准，输出不同 rescore 窗口大小下的 recall@10 和耗时
+    """
+    es = get_client(es_host)
+    exact = es.search(index=index_name, body=build_similarity_query(name, age, birthday))
+    print(f"全量脚本打分耗时: {exact['took']}ms")
+
+    results = []
+    for window_size in windows:
+        response = es.search(index=index_name, body=build_rescore_similarity_query(name, age, birthday, window_size))
+        id_recall, score_recall = recall_at_k(exact["hits"]["hits"], response["hits"]["hits"])
+        results.append({"window_size": window_size, "took": response["took"],
+                        "id_recall": id_recall, "score_recall": score_recall})
+        print(f"  window {window_size:>6}: {response['took']}ms, recall@10 {id_recall:.2f} (按分数 {score_recall:.2f})")
+    return results
+
+
+def compare_native_ranking(es_host, index_name, name, age, birthday, size=10):
+    """
+    对比脚本查询和原生查询的前 size 个结果，确认文档和分数一致，并输出两者耗时
+    """
+    es = get_client(es_host)
+    responses = {}
+    for label, query in (("script", build_similarity_query(name, age, birthday)),
+                         ("native", build_native_similarity_query(name, age, birthday))):
+        query["size"] = size
+        responses[label] = es.search(index=index_name, body=query)
+
+    ranked = {label: [(hit["_id"], hit["_score"]) for hit in r["hits"]["hits"]] for label, r in responses.items()}
+    same = ranked["script"] == ranked["native"]
+    print(f"脚本查询耗时 {responses['script']['took']}ms，原生查询耗时 {responses['native']['took']}ms，"
+          f"前{size}个结果{'一致' if same else '不一致'}")
+    if not same:
+        print(f"  脚本: {ranked['script']}")
+        print(f"  原生: {ranked['native']}")
+    return same
+
+
+def profile_similarity_query(es_host, index_name, name, age, birthday, output=None):
+    """
+    用 profile API 对比三个脚本的 function_score 查询和原生查询的耗时构成
+    """
+    es = get_client(es_host)
+    return compare_profiles(es, index_name, {
+        "script": build_similarity_query(name, age, birthday),
+        "native": build_native_similarity_query(name, age, birthday)
+    }, output=output)
+
+
+def test_similarity_query(es_host, index_name, name, age, birthday):
+    """
+    执行相似度查询并测量性能
+    """
+    es = get_client(es_host)
+
+    query = build_similarity_query(name, age, birthday)
 
     # 执行查询并测量时间
     start_time = time.time()
@@ -151,8 +342,138 @@ def test_similarity_query(es_host, index_name, name, age, birthday):
     }
 
 
+def iter_input_persons(path):
+    """
+    逐行读取 JSON Lines 格式的输入人员，每行形如 {"name": "张三", "age": 30, "birthday": "1990-01-01"}
+    """
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def batch_similarity_query(es, index_name, persons, batch_size=100, in_flight=4, build_query=build_similarity_query):
+    """
+    把输入人员打包成 _msearch 请求批量查询，最多 in_flight 个批次同时在途
+
+    :param persons: 输入人员的迭代器，按流式读取
+    :param build_query: 构建单个查询的函数，默认为脚本打分版本
+    :return: 按输入顺序返回 (person, response) 的迭代器，response 为单个查询的结果或错误信息
+    """
+    def run_batch(batch):
+        body = []
+        for person in batch:
+            body.append({"index": index_name})
+            body.append(build_query(person["name"], person["age"], person["birthday"]))
+        return es.msearch(body=body)["responses"]
+
+    persons = iter(persons)
+    pending = deque()
+    total = 0
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=in_flight) as executor:
+        while True:
+            batch = list(islice(persons, batch_size))
+            if batch:
+                pending.append((batch, executor.submit(run_batch, batch)))
+            # 在途批次已满或输入已读完时，按提交顺序取回最早的批次
+            while pending and (len(pending) >= in_flight or not batch):
+                done_batch, future = pending.popleft()
+                for person, response in zip(done_batch, future.result()):
+                    total += 1
+                    yield person, response
+            if not batch:
+                break
+
+    elapsed = time.perf_counter() - start_time
+    print(f"批量查询完成，共 {total} 个查询，耗时 {elapsed:.2f} 秒，{total / elapsed:.1f} queries/s")
+
+
+def benchmark_similarity_query(es_host, index_name, name, age, birthday, warmup=5, iterations=50, output=None):
+    """
+    预热后多次执行相似度查询，输出延迟百分位数和直方图
+    """
+    es = get_client(es_host)
+    query = build_similarity_query(name, age, birthday)
+    native_query = build_native_similarity_query(name, age, birthday)
+
+    harness = BenchmarkHarness(warmup=warmup, iterations=iterations)
+    harness.register("similarity_script_score", lambda: es.search(index=index_name, body=query))
+    harness.register("similarity_native", lambda: es.search(index=index_name, body=native_query))
+    results = harness.run()
+    harness.report(results)
+    if output:
+        harness.save_json(results, output)
+    return results
+
+
+def benchmark_stored_scripts(es_host, index_name, name, age, birthday, warmup=5, iterations=50):
+    """
+    对比内联脚本和 stored script 的延迟，并分别统计测量期间的脚本编译次数
+    """
+    es = get_client(es_host)
+    scripts.deploy(es)
+    inline_query = build_similarity_query(name, age, birthday)
+    stored_query = scripts.rewrite(inline_query)
+
+    results = {}
+    for label, query in (("similarity_inline", inline_query), ("similarity_stored", stored_query)):
+        harness = BenchmarkHarness(warmup=warmup, iterations=iterations)
+        harness.register(label, lambda q=query: es.search(index=index_name, body=q))
+        print(f"{label}:")
+        with track_script_stats(es) as script_delta:
+            results.update(harness.run())
+        results[label]["script_stats"] = script_delta
+    BenchmarkHarness.report(results)
+    return results
+
+
+def monitor_similarity_query(es_host, index_name, name, age, birthday, warmup=5, iterations=50, cooldown=10,
+                             report_path=None):
+    """
+    运行相似度查询基准测试的同时在后台采集集群指标，按采样窗口对齐客户端延迟和节点状态
+    """
+    from es.like_test.monitor_cluster_performance import BackgroundMonitor
+
+    es = get_client(es_host)
+    query = build_similarity_query(name, age, birthday)
+    with BackgroundMonitor(es_host) as monitor:
+        harness = BenchmarkHarness(warmup=warmup, iterations=iterations, on_phase=monitor.set_phase)
+        harness.register("similarity_script_score", monitor.timed(lambda: es.search(index=index_name, body=query)))
+        results = harness.run()
+        monitor.cooldown(cooldown)
+    harness.report(results)
+    monitor.report(report_path)
+    return results
+
+
+def load_test_similarity_query(es_host, index_name, name, age, birthday, rates=(5, 10, 20, 50), duration=30,
+                               concurrency=None):
+    """
+    按目标 QPS 逐步加压执行相似度查询，输出吞吐-延迟曲线
+
+    :param concurrency: 闭环压测的并发数列表，提供时再做一轮闭环压测，与开环结果对照
+    :return: {"open": 开环曲线, "closed": 闭环曲线（没有提供 concurrency 时为空列表）}
+    """
+    # 压测使用连接池足够大的独立客户端，避免请求在客户端排队
+    es, pool_size = load_client(max([LOAD_WORKERS, *(concurrency or ())]), es_host)
+    query = build_similarity_query(name, age, birthday)
+
+    def run():
+        return es.search(index=index_name, body=query)
+
+    print("开环压测:")
+    results = {"open": sweep_rates(run, rates, duration=duration, pool_size=pool_size), "closed": []}
+    if concurrency:
+        print("闭环压测:")
+        results["closed"] = sweep_concurrency(run, concurrency, duration=duration, pool_size=pool_size)
+    return results
+
+
 if __name__ == "__main__":
-    ES_HOST = "http://localhost:9200"
+    # 为 None 时使用环境变量 ES_HOSTS 中的地址，默认 http://localhost:9200
+    ES_HOST = None
     INDEX_NAME = "person_test"
 
     # 测试参数
@@ -161,3 +482,30 @@ if __name__ == "__main__":
     test_birthday = "1990-01-01"
 
     result = test_similarity_query(ES_HOST, INDEX_NAME, test_name, test_age, test_birthday)
+
+    # 多次测量的延迟分布
+    # benchmark_similarity_query(ES_HOST, INDEX_NAME, test_name, test_age, test_birthday, output="similarity_bench.json")
+
+    # 基准测试期间在后台采集集群指标，输出延迟与节点状态的对照报告
+    # monitor_similarity_query(ES_HOST, INDEX_NAME, test_name, test_age, test_birthday, report_path="similarity_monitor.csv")
+
+    # 内联脚本与 stored script 的延迟和脚本编译次数对比
+    # benchmark_stored_scripts(ES_HOST, INDEX_NAME, test_name, test_age, test_birthday)
+
+    # 校验原生查询的排序与脚本查询一致
+    # compare_native_ranking(ES_HOST, INDEX_NAME, test_name, test_age, test_birthday)
+
+    # 脚本查询与原生查询的 profile 对比
+    # profile_similarity_query(ES_HOST, INDEX_NAME, test_name, test_age, test_birthday, output="similarity_profile.json")
+
+    # 两阶段查询在不同 rescore 窗口下的召回率
+    # evaluate_rescore_windows(ES_HOST, INDEX_NAME, test_name, test_age, test_birthday)
+
+    # 从文件批量读取输入人员，用 _msearch 查询
+    # for person, response in batch_similarity_query(get_client(), INDEX_NAME,
+    #                                                iter_input_persons("input_persons.jsonl")):
+    #     print(person["name"], [hit["_id"] for hit in response.get("hits", {}).get("hits", [])])
+
+    # 开环压测找出饱和点，再用闭环压测对照
+    # load_test_similarity_query(ES_HOST, INDEX_NAME, test_name, test_age, test_birthday, rates=(5, 10, 20, 50),
+    #                            concurrency=(1, 4, 16))
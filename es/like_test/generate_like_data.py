@@ -1,68 +1,67 @@
-import random
-from datetime import datetime, timedelta
-from elasticsearch import Elasticsearch, helpers
-
-# 连接Elasticsearch
-es = Elasticsearch(["http://localhost:9200"])
+from es.adaptive_bulk import adaptive_bulk
+from es.batch_data import iter_person_test_docs
+from es.es_client import get_client
+from es.fast_load import fast_load
 
 # 索引名称
 index_name = "person_test"
 
-# 如果索引存在，则删除它（仅用于测试，生产环境不要这样）
-if es.indices.exists(index=index_name):
-    es.indices.delete(index=index_name)
 
 # 创建索引
-es.indices.create(index=index_name, body={
-    "mappings": {
-        "properties": {
-            "name": {"type": "keyword"},
-            "age": {"type": "integer"},
-            "birthday": {"type": "date", "format": "yyyy-MM-dd"}
+def create_index(es):
+    # 如果索引存在，则删除它（仅用于测试，生产环境不要这样）
+    if es.indices.exists(index=index_name):
+        es.indices.delete(index=index_name)
+
+    es.indices.create(index=index_name, body={
+        "mappings": {
+            "properties": {
+                "name": {"type": "keyword"},
+                "age": {"type": "integer"},
+                "birthday": {"type": "date", "format": "yyyy-MM-dd"},
+                # 姓名中每个位置的字符，格式为 "位置:字符"，用于原生查询计算相同位置的字符数
+                "name_pos": {"type": "keyword"}
+            }
         }
-    }
-})
+    })
+
+
+# 姓名按位置拆分成 "位置:字符" 的形式
+def name_positions(name):
+    return [f"{i}:{ch}" for i, ch in enumerate(name)]
 
-# 生成随机姓名
-def generate_name():
-    first_names = ['张', '王', '李', '赵', '陈', '黄', '周', '吴', '刘', '孙']
-    last_names = ['明', '芳', '静', '伟', '秀英', '强', '磊', '洋', '艳', '勇', '杰', '娟', '涛', '超', '鹏', '华', '平', '刚', '辉', '兰']
-    return random.choice(first_names) + random.choice(last_names)
 
-# 生成随机年龄
-def generate_age():
-    return random.randint(18, 80)
+# 写入前补充派生字段
+def enrich_source(source):
+    source["name_pos"] = name_positions(source["name"])
+    return source
 
-# 生成随机生日（1950-01-01 到 2005-12-31）
-def generate_birthday():
-    start_date = datetime(1950, 1, 1)
-    end_date = datetime(2005, 12, 31)
-    days_between = (end_date - start_date).days
-    random_days = random.randint(0, days_between)
-    return (start_date + timedelta(days=random_days)).strftime("%Y-%m-%d")
 
-# 生成文档
-def generate_documents(n):
-    for i in range(1, n+1):
+# 生成文档（按列批量生成姓名、年龄和生日）
+def generate_documents(n, seed=None):
+    for doc_id, source in iter_person_test_docs(n, seed=seed):
         yield {
             "_index": index_name,
-            "_id": i,
-            "_source": {
-                "name": generate_name(),
-                "age": generate_age(),
-                "birthday": generate_birthday()
-            }
+            "_id": doc_id,
+            "_source": enrich_source(source)
         }
 
-# 批量插入
-def bulk_insert(es, documents, chunk_size=1000):
-    try:
-        helpers.bulk(es, documents, chunk_size=chunk_size)
-        print("数据插入完成")
-    except Exception as e:
-        print(f"插入数据时发生错误: {e}")
 
-# 插入14万条数据
-total_docs = 140000
-documents = generate_documents(total_docs)
-bulk_insert(es, documents, chunk_size=1000)
\ No newline at end of file
+# 批量插入：批次大小和并发数按集群的延迟和拒绝情况自动调整，只重试被拒绝的文档
+def bulk_insert(es, documents, trace_path=None):
+    success, failed = adaptive_bulk(es, documents, trace_path=trace_path)
+    print(f"数据插入完成，成功 {success} 条，失败 {failed} 条")
+    return success, failed
+
+
+if __name__ == "__main__":
+    # 连接Elasticsearch
+    es = get_client()
+    create_index(es)
+
+    # 插入14万条数据
+    total_docs = 140000
+    documents = generate_documents(total_docs)
+    # 写入期间关闭 refresh 和副本，结束后恢复并合并段
+    with fast_load(es, index_name):
+        bulk_insert(es, documents)
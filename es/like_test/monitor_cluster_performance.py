@@ -1,75 +1,208 @@
-import requests
+import csv
 import json
+import threading
 import time
-from datetime import datetime
 
+from es.cluster_metrics import MetricsCollector
+from es.es_client import client_options, get_hosts, get_http_session
+from es.latency_stats import summarize
 
-def monitor_cluster(es_host, interval=5, duration=60):
+# 复用 keep-alive 连接，避免每次采样都重新建立连接
+session = get_http_session()
+timeout = client_options()["request_timeout"]
+
+
+def monitor_cluster(es_host, interval=5, duration=60, csv_path=None):
     """
     监控Elasticsearch集群性能指标
+
+    每个节点输出一行，速率和延迟为两次采样之间的增量，而不是进程启动以来的平均值
     """
     print(f"开始监控集群，间隔: {interval}秒，持续时间: {duration}秒")
-    print("时间戳,状态,节点数,分片数,未分配分片,CPU使用率%,堆内存使用率%,查询延迟(ms)")
+    print("时间戳,状态,节点数,未分配分片,节点,CPU使用率%,堆内存使用率%,查询QPS,查询延迟(ms),"
+          "写入速率(docs/s),GC次数,GC耗时(ms),search队列,search拒绝数")
+
+    def print_sample(sample):
+        for row in sample["nodes"]:
+            print(f"{sample['timestamp']},{sample['status']},{sample['number_of_nodes']},{sample['unassigned_shards']},"
+                  f"{row['node']},{row['cpu_percent']},{row['heap_percent']},{row['search_rate']:.1f},"
+                  f"{row['search_latency_ms']:.2f},{row['index_rate']:.1f},{row['gc_count']},{row['gc_ms']},"
+                  f"{row['search_queue']},{row['search_rejected']}")
+
+    collector = MetricsCollector(es_host, max_samples=int(duration // interval) + 1)
+    try:
+        collector.run(interval=interval, duration=duration, on_sample=print_sample)
+        if csv_path:
+            collector.to_csv(csv_path)
+    finally:
+        collector.close()
+    return collector
+
+
+class BackgroundMonitor:
+    """
+    在后台线程中采集集群指标，同时记录客户端请求延迟，两者都带上当前的测试阶段标签
 
-    end_time = time.time() + duration
-    headers = {'Content-Type': 'application/json'}
+    结束后按采样窗口把客户端延迟百分位数与节点 CPU、堆内存、GC、search 队列对齐输出，
+    用来判断延迟抖动来自查询本身还是集群状态
+    """
 
-    while time.time() < end_time:
+    def __init__(self, es_host=None, interval=1, max_samples=3600, percentiles=(50, 95, 99)):
+        self.collector = MetricsCollector(es_host, max_samples=max_samples)
+        self.interval = interval
+        self.percentiles = percentiles
+        self.phase = "idle"
+        # 阶段切换记录 (切换时间, 阶段)，采样按窗口结束时间查找所属阶段
+        self._phases = [(float("-inf"), "idle")]
+        self.latencies = []
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _tag(self, sample):
+        # set_phase 切换前会先结束当前窗口，窗口结束前最后一次切换的阶段就是整个窗口的阶段
+        sample["phase"] = next(phase for switched, phase in reversed(self._phases) if switched < sample["time"])
+
+    def _sample(self):
+        sample = self.collector.sample()
+        if sample is not None:
+            self._tag(sample)
+
+    def start(self):
+        # 先同步采集一次基线，保证第一个窗口从启动时刻开始
+        self.collector.sample()
+        self._thread = threading.Thread(
+            target=self.collector.run,
+            kwargs={"interval": self.interval, "duration": None, "on_sample": self._tag, "stop_event": self._stop},
+            daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
         try:
-            # 获取集群健康状态
-            health_url = f"{es_host}/_cluster/health"
-            health_response = requests.get(health_url, headers=headers)
-            health_data = health_response.json()
-
-            # 获取节点状态
-            nodes_url = f"{es_host}/_nodes/stats"
-            nodes_response = requests.get(nodes_url, headers=headers)
-            nodes_data = nodes_response.json()
-
-            # 提取关键指标
-            status = health_data.get('status', 'unknown')
-            node_count = health_data.get('number_of_nodes', 0)
-            shard_count = health_data.get('active_shards', 0)
-            unassigned_shards = health_data.get('unassigned_shards', 0)
-
-            # 提取CPU和内存使用率
-            cpu_percent = 0
-            heap_percent = 0
-            for node_id, node_info in nodes_data.get('nodes', {}).items():
-                cpu_percent = node_info.get('os', {}).get('cpu', {}).get('percent', 0)
-                heap_percent = node_info.get('jvm', {}).get('mem', {}).get('heap_used_percent', 0)
-                break  # 只取第一个节点的数据
-
-            # 获取查询延迟（如果有）
-            search_latency = 0
-            if 'indices' in nodes_data.get('nodes', {}).get(next(iter(nodes_data.get('nodes', {}))), {}):
-                search_stats = nodes_data['nodes'][next(iter(nodes_data['nodes']))]['indices']['search']
-                if search_stats['query_total'] > 0:
-                    search_latency = search_stats['query_time_in_millis'] / search_stats['query_total']
-
-            # 打印监控数据
-            timestamp = datetime.now().strftime("%H:%M:%S")
-            print(
-                f"{timestamp},{status},{node_count},{shard_count},{unassigned_shards},{cpu_percent},{heap_percent},{search_latency:.2f}")
-
-            time.sleep(interval)
-
-        except Exception as e:
-            print(f"监控出错: {e}")
-            time.sleep(interval)
+            if self._thread is not None:
+                self._thread.join()
+                self._thread = None
+                # 补采最后一个窗口
+                self._sample()
+        finally:
+            self.collector.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def set_phase(self, phase, name=None):
+        """
+        切换阶段，参数与 BenchmarkHarness 的 on_phase 回调一致
+
+        切换前先采样一次，把当前窗口结束在旧阶段，避免一个窗口跨两个阶段
+        """
+        phase = phase if name is None else f"{phase}:{name}"
+        with self._lock:
+            if phase == self.phase:
+                return
+            if self._thread is not None:
+                try:
+                    self._sample()
+                except Exception as e:
+                    print(f"采样出错: {e}")
+            self.phase = phase
+            self._phases.append((time.monotonic(), phase))
+
+    def cooldown(self, seconds):
+        """
+        测试结束后继续采样一段时间，观察集群恢复情况
+        """
+        self.set_phase("cooldown")
+        time.sleep(seconds)
+
+    def record(self, latency_ms):
+        self.latencies.append((time.monotonic(), self.phase, latency_ms))
+
+    def timed(self, run):
+        """
+        包装请求函数，每次调用时记录客户端延迟
+        """
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return run(*args, **kwargs)
+            finally:
+                self.record((time.perf_counter_ns() - start) / 1e6)
+        return wrapper
+
+    def report(self, csv_path=None):
+        """
+        按采样窗口输出：阶段、客户端请求数和延迟百分位数、各节点中最高的 CPU / 堆内存 / search 队列、GC 次数和耗时合计
+        """
+        samples = list(self.collector.samples)
+        latencies = sorted(self.latencies)
+        rows = []
+        window_start = self.collector.start_time
+        i = 0
+        for sample in samples:
+            window = []
+            while i < len(latencies) and latencies[i][0] <= sample["time"]:
+                if latencies[i][0] > window_start:
+                    window.append(latencies[i][2])
+                i += 1
+            window_start = sample["time"]
+            stats = summarize(window, self.percentiles)
+            nodes = sample["nodes"]
+            row = {
+                "timestamp": sample["timestamp"],
+                "phase": sample.get("phase", "idle"),
+                "requests": stats["count"],
+                **{f"p{p}_ms": stats.get(f"p{p}", 0.0) for p in self.percentiles},
+                "cpu_percent": max((n["cpu_percent"] for n in nodes), default=0),
+                "heap_percent": max((n["heap_percent"] for n in nodes), default=0),
+                "gc_count": sum(n["gc_count"] for n in nodes),
+                "gc_ms": sum(n["gc_ms"] for n in nodes),
+                "search_queue": max((n["search_queue"] for n in nodes), default=0),
+                "search_rejected": sum(n["search_rejected"] for n in nodes),
+            }
+            rows.append(row)
+
+        print("时间戳,阶段,请求数," + ",".join(f"p{p}(ms)" for p in self.percentiles)
+              + ",CPU使用率%,堆内存使用率%,GC次数,GC耗时(ms),search队列,search拒绝数")
+        for row in rows:
+            print(f"{row['timestamp']},{row['phase']},{row['requests']},"
+                  + ",".join(f"{row[f'p{p}_ms']:.2f}" for p in self.percentiles)
+                  + f",{row['cpu_percent']},{row['heap_percent']},{row['gc_count']},{row['gc_ms']},"
+                    f"{row['search_queue']},{row['search_rejected']}")
+
+        # 每个阶段的客户端延迟汇总
+        by_phase = {}
+        for _, phase, latency in latencies:
+            by_phase.setdefault(phase, []).append(latency)
+        for phase, values in by_phase.items():
+            stats = summarize(values, self.percentiles)
+            print(f"阶段 {phase}: {stats['count']} 个请求, "
+                  + ", ".join(f"p{p} {stats[f'p{p}']:.2f}ms" for p in self.percentiles))
+
+        if csv_path and rows:
+            with open(csv_path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+            print(f"报告已保存到 {csv_path}")
+        return rows
 
 
 def get_detailed_cluster_stats(es_host):
     """
     获取详细的集群统计信息
     """
-    headers = {'Content-Type': 'application/json'}
 
     print("=== 集群详细统计 ===")
 
     # 集群健康
     health_url = f"{es_host}/_cluster/health"
-    health_response = requests.get(health_url, headers=headers)
+    health_response = session.get(health_url, timeout=timeout)
     health_data = health_response.json()
     print(f"集群状态: {health_data.get('status')}")
     print(f"节点数: {health_data.get('number_of_nodes')}")
@@ -80,7 +213,7 @@ def get_detailed_cluster_stats(es_host):
 
     # 节点统计
     nodes_url = f"{es_host}/_nodes/stats"
-    nodes_response = requests.get(nodes_url, headers=headers)
+    nodes_response = session.get(nodes_url, timeout=timeout)
     nodes_data = nodes_response.json()
 
     print("\n=== 节点统计 ===")
@@ -93,7 +226,7 @@ def get_detailed_cluster_stats(es_host):
 
     # 索引统计
     indices_url = f"{es_host}/_stats"
-    indices_response = requests.get(indices_url, headers=headers)
+    indices_response = session.get(indices_url, timeout=timeout)
     indices_data = indices_response.json()
 
     print("\n=== 索引统计 ===")
@@ -105,7 +238,8 @@ def get_detailed_cluster_stats(es_host):
 
 
 if __name__ == "__main__":
-    ES_HOST = "http://localhost:9200"
+    # 使用环境变量 ES_HOSTS 中的第一个地址，默认 http://localhost:9200
+    ES_HOST = get_hosts()[0]
 
     # 获取一次详细统计
     get_detailed_cluster_stats(ES_HOST)
@@ -0,0 +1,156 @@
+import time
+from datetime import datetime
+
+import numpy as np
+from es.batch_data import FIRST_NAMES, LAST_NAMES, person_test_columns
+from es.es_client import get_client
+from es.like_test.excute_like import build_similarity_query
+from es.pit_reader import iter_pit_hits
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def _utf16_units(name):
+    # 与 Java String.charAt 一致，按 UTF-16 码元比较
+    return np.frombuffer(name.encode("utf-16-le"), dtype=np.uint16)
+
+
+class SimilarityEngine:
+    """
+    在内存中用 NumPy 列数据计算与 excute_like.build_similarity_query 相同的姓名、年龄、生日相似度分数
+
+    缺失的字段与脚本中 size() == 0 的分支一致，得 1 分
+    """
+
+    def __init__(self, ids, names, ages, birthday_days):
+        self.ids = np.asarray(ids)
+        n = len(self.ids)
+
+        units = [_utf16_units(name) if name else np.empty(0, dtype=np.uint16) for name in names]
+        width = max((len(u) for u in units), default=0)
+        # 定宽存储，每个位置一行，便于逐位置做连续内存比较；不足的位置补 0（姓名中不会出现 0）
+        self.name_codes = np.zeros((width, n), dtype=np.uint16)
+        for i, u in enumerate(units):
+            self.name_codes[:len(u), i] = u
+        # 相同位置字符数到姓名分数的映射
+        self.name_scores = np.array([6 if c > 5 else 3 if c > 2 else 1 for c in range(width + 1)], dtype=np.int8)
+
+        ages = np.array([-1 if a is None else a for a in ages], dtype=np.int32)
+        self.has_age = ages >= 0
+        self.ages = ages
+        days = np.array([0 if d is None else d for d in birthday_days], dtype=np.int64)
+        self.has_birthday = np.array([d is not None for d in birthday_days], dtype=bool)
+        self.birthday_ms = days * DAY_MS
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_generator(cls, n, seed=None, block_size=100_000, start_id=1):
+        """
+        用与 batch_data.iter_person_test_docs 相同的随机序列生成数据，seed 相同时与写入索引的数据一致
+        """
+        rng = np.random.default_rng(seed)
+        first = np.array(FIRST_NAMES, dtype=object)
+        last = np.array(LAST_NAMES, dtype=object)
+        names, ages, days = [], [], []
+        for start in range(0, n, block_size):
+            cols = person_test_columns(rng, min(block_size, n - start))
+            names.append(first[cols["first_name"]] + last[cols["last_name"]])
+            ages.append(cols["age"])
+            days.append(cols["birthday"])
+        ids = np.arange(start_id, start_id + n)
+        return cls(ids, np.concatenate(names).tolist() if names else [],
+                   np.concatenate(ages).tolist() if ages else [],
+                   np.concatenate(days).tolist() if days else [])
+
+    @classmethod
+    def from_index(cls, es, index_name, slices=4):
+        """
+        用 PIT 切片读取整个索引的 name / age / birthday
+        """
+        ids, names, ages, days = [], [], [], []
+        epoch = datetime(1970, 1, 1)
+        for hit in iter_pit_hits(es, index_name, slices=slices, source=["name", "age", "birthday"]):
+            source = hit["_source"]
+            ids.append(hit["_id"])
+            names.append(source.get("name"))
+            ages.append(source.get("age"))
+            birthday = source.get("birthday")
+            days.append((datetime.strptime(birthday, "%Y-%m-%d") - epoch).days if birthday else None)
+        return cls(ids, names, ages, days)
+
+    def score(self, name, age, birthday):
+        """
+        计算所有文档的分数，参数与 build_similarity_query 相同
+        """
+        # 与脚本查询相同，输入生日按本地时区转换为毫秒时间戳
+        birthday_ts = int(datetime.strptime(birthday, "%Y-%m-%d").timestamp() * 1000)
+
+        # 姓名：相同位置字符数 > 5 得 6 分，> 2 得 3 分，否则 1 分
+        common = np.zeros(len(self), dtype=np.int8)
+        for position, unit in enumerate(_utf16_units(name)[:len(self.name_codes)]):
+            common += self.name_codes[position] == unit
+        scores = self.name_scores[common]
+
+        # 年龄：差值 <= 5 得 5 分，否则 1 分
+        scores += 1 + 4 * (self.has_age & (np.abs(self.ages - age) <= 5)).astype(np.int8)
+
+        # 生日：相差 < 1 天得 5 分，< 3 天得 4 分，否则 1 分（floor(diff / 一天) < n 等价于 diff < n 天）
+        diff = np.abs(self.birthday_ms - birthday_ts)
+        scores += 1 + (self.has_birthday & (diff < 3 * DAY_MS)).astype(np.int8) * 3 \
+            + (self.has_birthday & (diff < DAY_MS)).astype(np.int8)
+        return scores
+
+    def top_k(self, name, age, birthday, k=10):
+        """
+        返回分数最高的 k 个文档 [(id, score), ...]，按分数降序
+        """
+        scores = self.score(name, age, birthday)
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return list(zip(self.ids[top].tolist(), scores[top].tolist()))
+
+    def top_k_batch(self, queries, k=10):
+        """
+        批量查询，queries 为 (name, age, birthday) 的列表
+        """
+        return [self.top_k(name, age, birthday, k) for name, age, birthday in queries]
+
+    def check_against_es(self, es, index_name, name, age, birthday, k=10):
+        """
+        与 Elasticsearch 脚本打分结果对比：前 k 个分数序列相同，且 ES 返回的每个文档在本地的分数一致
+        """
+        query = build_similarity_query(name, age, birthday)
+        query["size"] = k
+        hits = es.search(index=index_name, body=query)["hits"]["hits"]
+
+        local = self.top_k(name, age, birthday, k)
+        scores = self.score(name, age, birthday)
+        positions = {str(doc_id): i for i, doc_id in enumerate(self.ids.tolist())}
+
+        same_scores = [s for _, s in local] == [hit["_score"] for hit in hits]
+        same_docs = all(scores[positions[hit["_id"]]] == hit["_score"] for hit in hits if hit["_id"] in positions)
+        print(f"本地前{k}个分数: {[s for _, s in local]}，ES: {[hit['_score'] for hit in hits]}，"
+              f"{'一致' if same_scores and same_docs else '不一致'}")
+        return same_scores and same_docs
+
+
+if __name__ == "__main__":
+    INDEX_NAME = "person_test"
+
+    # 连接地址通过环境变量 ES_HOSTS 设置
+    es = get_client()
+    engine = SimilarityEngine.from_index(es, INDEX_NAME)
+    print(f"已加载 {len(engine)} 条数据")
+
+    engine.check_against_es(es, INDEX_NAME, "张三", 30, "1990-01-01")
+
+    queries = [("张三", 30, "1990-01-01"), ("王秀英", 45, "1978-06-15"), ("李明", 22, "2001-12-31")] * 100
+    start_time = time.perf_counter()
+    engine.top_k_batch(queries)
+    elapsed_ms = (time.perf_counter() - start_time) * 1000
+    print(f"批量查询 {len(queries)} 次，平均每次 {elapsed_ms / len(queries):.2f}ms")
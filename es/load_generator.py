@@ -0,0 +1,162 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from es.es_client import client_options, create_client
+from es.latency_stats import summarize
+
+# 报告中的百分位数
+LOAD_PERCENTILES = (50, 90, 99)
+
+# 开环压测的默认工作线程数
+LOAD_WORKERS = 32
+
+
+def load_client(threads, hosts=None):
+    """
+    创建压测专用的客户端，连接池不小于压测线程数
+
+    共享客户端的连接池只有 ES_CONNECTIONS_PER_NODE 个连接，取不到连接的请求会在客户端排队，
+    开环压测从计划发送时间计算延迟，这段排队时间会被算成集群的延迟
+    :return: (客户端, 连接池大小)
+    """
+    pool_size = max(threads, client_options()["connections_per_node"])
+    return create_client(hosts, connections_per_node=pool_size), pool_size
+
+
+def _check_pool(threads, pool_size):
+    if pool_size is None:
+        # 没有指定时按共享客户端的连接池大小检查
+        pool_size = client_options()["connections_per_node"]
+    if threads > pool_size:
+        print(f"警告: {threads} 个压测线程多于客户端连接池的 {pool_size} 个连接，多出的请求会在客户端排队，"
+              f"测得的延迟和饱和点反映的是客户端的限制，请用 load_client 创建足够大的连接池")
+
+
+def run_open_loop(run, qps, duration=30, workers=LOAD_WORKERS):
+    """
+    开环压测：按目标 QPS 的固定节奏发送请求，不等待上一个请求返回
+
+    延迟从计划发送时间开始计算，请求在本地排队的时间也算在内，
+    避免集群变慢时压测端跟着降速而低估延迟（coordinated omission）
+
+    :param run: 无参函数，执行一次查询
+    :param qps: 目标每秒请求数
+    :param duration: 持续秒数
+    :param workers: 工作线程数
+    """
+    interval = 1.0 / qps
+    total = int(qps * duration)
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def task(intended):
+        try:
+            run()
+        except Exception:
+            with lock:
+                errors[0] += 1
+            return
+        latency_ms = (time.perf_counter() - intended) * 1000
+        with lock:
+            latencies.append(latency_ms)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i in range(total):
+            intended = start + i * interval
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(task, intended)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "mode": "open",
+        "target_qps": qps,
+        "achieved_qps": len(latencies) / elapsed,
+        "errors": errors[0],
+        "latency_ms": summarize(latencies, LOAD_PERCENTILES)
+    }
+
+
+def run_closed_loop(run, concurrency, duration=30):
+    """
+    闭环压测：concurrency 个线程各自连续发送请求，延迟从实际发送时间开始计算
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                run()
+            except Exception:
+                with lock:
+                    errors[0] += 1
+                continue
+            latency_ms = (time.perf_counter() - start) * 1000
+            with lock:
+                latencies.append(latency_ms)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "mode": "closed",
+        "concurrency": concurrency,
+        "achieved_qps": len(latencies) / elapsed,
+        "errors": errors[0],
+        "latency_ms": summarize(latencies, LOAD_PERCENTILES)
+    }
+
+
+def sweep_rates(run, rates, duration=30, workers=LOAD_WORKERS, min_ratio=0.95, pool_size=None):
+    """
+    逐步提高目标 QPS，输出吞吐-延迟曲线
+
+    实际吞吐低于目标的 min_ratio 时认为集群已饱和，后面的速率不再测试
+    :param pool_size: run 使用的客户端每个节点的连接数，为 None 时按共享客户端的配置检查
+    """
+    _check_pool(workers, pool_size)
+    curve = []
+    print(f"{'target':>8} {'achieved':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9} {'errors':>7}")
+    for qps in rates:
+        result = run_open_loop(run, qps, duration=duration, workers=workers)
+        curve.append(result)
+        s = result["latency_ms"]
+        print(f"{qps:>8} {result['achieved_qps']:>9.1f} {s['p50']:>9.1f} {s['p90']:>9.1f} "
+              f"{s['p99']:>9.1f} {s['max']:>9.1f} {result['errors']:>7}")
+        if result["achieved_qps"] < qps * min_ratio:
+            print(f"实际吞吐低于目标的 {min_ratio:.0%}，饱和点约为 {result['achieved_qps']:.1f} QPS")
+            break
+    return curve
+
+
+def sweep_concurrency(run, levels, duration=30, pool_size=None):
+    """
+    逐步提高闭环压测的并发数，输出吞吐-延迟曲线，与 sweep_rates 的开环结果对照
+
+    闭环的延迟不包含请求在压测端排队的时间，集群变慢时发送速率会跟着下降，
+    同样吞吐下的尾延迟通常比开环低，两者的差距就是被协调遗漏（coordinated omission）掩盖的部分
+    :param pool_size: 同 sweep_rates
+    """
+    _check_pool(max(levels), pool_size)
+    curve = []
+    print(f"{'conc':>8} {'achieved':>9} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9} {'errors':>7}")
+    for concurrency in levels:
+        result = run_closed_loop(run, concurrency, duration=duration)
+        curve.append(result)
+        s = result["latency_ms"]
+        print(f"{concurrency:>8} {result['achieved_qps']:>9.1f} {s['p50']:>9.1f} {s['p90']:>9.1f} "
+              f"{s['p99']:>9.1f} {s['max']:>9.1f} {result['errors']:>7}")
+    return curve
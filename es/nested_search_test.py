@@ -1,15 +1,28 @@
-from elasticsearch import Elasticsearch, helpers
 from faker import Faker
 import random
-from datetime import datetime, timedelta, time
+from contextlib import nullcontext
+from functools import partial
 import json
 import time
 
+from es.adaptive_bulk import adaptive_bulk
+from es.batch_data import iter_person_docs
+from es.batch_planner import BatchPlanner, iter_planned, max_batch_size
+from es.bulk_loader import parallel_load
+from es.composite_pager import hex_prefix_partitions, iter_composite_buckets
+from es.es_client import get_client
+from es.fast_load import fast_load
+from es.group_stats import GroupStatsReducer
+from es.id_store import UuidStore
+from es.pit_reader import iter_pit_hits
+from es.query_profile import compare_profiles
+
 # 初始化Faker实例
 fake = Faker()
 
 # 初始化Elasticsearch客户端
-es = Elasticsearch(["http://localhost:9200"])  # 根据实际情况修改连接信息
+# 连接地址通过环境变量 ES_HOSTS 设置，默认 http://localhost:9200
+es = get_client()
 
 # 定义索引映射
 person_mapping = {
@@ -55,33 +68,39 @@ def create_indices():
         print("Created 'group' index.")
 
 
-# 数据生成函数
-def generate_person():
-    return {
-        "id": fake.uuid4(),
-        "name": fake.name(),
-        "age": random.randint(18, 80),
-        "birthday": (datetime.now() - timedelta(days=random.randint(365 * 18, 365 * 80))).isoformat(),
-        "region": fake.city(),
-        "rep_office": random.choice([10, 11, 12]),
-        "rep": random.choice([9, 10, 11])
-    }
+# 生成一段person数据，供多进程写入使用
+def build_person_actions(start, count, seed=None):
+    # 按列批量生成，seed 为 None 时每个子进程使用独立的随机状态
+    return iter_person_docs(count, seed=seed)
 
 
 # 批量插入person数据
-def load_person_data(num_records=1_500_000):
-    actions = (
-        {
-            "_index": "person",
-            "_id": generate_person()["id"],
-            "_source": generate_person()
-        }
-        for _ in range(num_records)
-    )
+def load_person_data(num_records=1_500_000, workers=None, in_flight=2, chunk_size=500, seed=None, fast=True):
+    """
+    :param workers: 为 None 时单线程写入，否则使用多进程并行生成和写入
+    :param in_flight: 并行模式下每个进程同时在途的 bulk 请求数
+    :param chunk_size: 并行模式下每个 bulk 请求的文档数，单线程写入时批次大小按字节数自动调整
+    :param seed: 随机种子，固定后可以重复生成相同的数据
+    :param fast: 是否使用批量写入模式（fast_load）
+    """
+    # 写入期间关闭 refresh 和副本，结束后恢复设置并合并段
+    with fast_load(es, "person") if fast else nullcontext():
+        if workers is not None:
+            return parallel_load(None, "person", build_person_actions, num_records,
+                                 workers=workers, in_flight=in_flight, chunk_size=chunk_size, seed=seed)
+
+        actions = (
+            {
+                "_index": "person",
+                "_id": person["id"],
+                "_source": person
+            }
+            for _, person in iter_person_docs(num_records, seed=seed)
+        )
 
-    print(f"开始插入 {num_records} 条person数据...")
-    success, failed = helpers.bulk(es, actions, chunk_size=500, request_timeout=60)
-    print(f"成功插入 {success} 条记录，失败 {failed} 条记录")
+        print(f"开始插入 {num_records} 条person数据...")
+        success, failed = adaptive_bulk(es, actions, request_timeout=60)
+        print(f"成功插入 {success} 条记录，失败 {failed} 条记录")
 
 
 # 数据生成函数
@@ -96,178 +115,204 @@ def generate_group(person_ids):
     }
 
 
+# 生成一段group数据，供多进程写入使用
+def build_group_actions(start, count, seed=None, person_ids=()):
+    random.seed(seed)
+    fake.seed_instance(seed)
+    for _ in range(count):
+        group = generate_group(person_ids)
+        yield group["group_id"], group
+
+
 # 批量插入group数据
-def load_group_data(num_records=5000):
+def load_group_data(num_records=5000, workers=None, in_flight=2, chunk_size=500, fast=True):
     # 获取所有person的ID
     person_ids = [doc["_id"] for doc in es.search(index="person", size=10000)["hits"]["hits"]]
     if len(person_ids) < num_records:
         print("Warning: Not enough person records to create all groups.")
         return
 
-    actions = (
-        {
-            "_index": "group",
-            "_id": generate_group(person_ids)["group_id"],
-            "_source": generate_group(person_ids)
-        }
-        for _ in range(num_records)
-    )
+    with fast_load(es, "group") if fast else nullcontext():
+        if workers is not None:
+            return parallel_load(None, "group", partial(build_group_actions, person_ids=person_ids), num_records,
+                                 workers=workers, in_flight=in_flight, chunk_size=chunk_size)
+
+        actions = (
+            {
+                "_index": "group",
+                "_id": group["group_id"],
+                "_source": group
+            }
+            for group in (generate_group(person_ids) for _ in range(num_records))
+        )
 
-    print(f"开始插入 {num_records} 条group数据...")
-    success, failed = helpers.bulk(es, actions, chunk_size=500, request_timeout=60)
-    print(f"成功插入 {success} 条记录，失败 {failed} 条记录")
+        print(f"开始插入 {num_records} 条group数据...")
+        success, failed = adaptive_bulk(es, actions, request_timeout=60)
+        print(f"成功插入 {success} 条记录，失败 {failed} 条记录")
+
+
+def build_group_aggs(person_ids_batch):
+    """
+    每个group下统计命中person的总数、年龄大于35和2000年后出生的人数
+    """
+    return {
+        "filtered_persons": {
+            "nested": {
+                "path": "person_list"
+            },
+            "aggs": {
+                "matched_persons": {
+                    "filter": {
+                        "terms": {
+                            "person_list.id": person_ids_batch
+                        }
+                    },
+                    "aggs": {
+                        "total_count": {
+                            "value_count": {
+                                "field": "person_list.id"
+                            }
+                        },
+                        "age_gt_35": {
+                            "filter": {
+                                "range": {
+                                    "person_list.age": {
+                                        "gt": 35
+                                    }
+                                }
+                            },
+                            "aggs": {
+                                "count_age_gt_35": {
+                                    "value_count": {
+                                        "field": "person_list.id"
+                                    }
+                                }
+                            }
+                        },
+                        "birthday_after_2000": {
+                            "filter": {
+                                "range": {
+                                    "person_list.birthday": {
+                                        "gt": "2000-01-01"
+                                    }
+                                }
+                            },
+                            "aggs": {
+                                "count_birthday_after_2000": {
+                                    "value_count": {
+                                        "field": "person_list.id"
+                                    }
+                                }
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    }
 
 
 # 查询并统计
 # 查询并统计
-def aggregate_group_data():
-    # 第一步：滚动查询获取符合条件的person ID
+def aggregate_group_data(slices=4, partitions=4, page_size=1000, concurrency=4, spill_path=None, monitor=None,
+                         goal="throughput", min_batch_size=1024, slim=True):
+    """
+    :param slices: 读取person ID时的PIT切片数
+    :param partitions: 每批次composite聚合的group_id分区数
+    :param page_size: composite聚合每页的桶数
+    :param concurrency: 同时在途的批次数
+    :param spill_path: 不为 None 时person ID存放到该内存映射文件中
+    :param monitor: 可选的 BackgroundMonitor，记录每个批次的耗时并给采样打上阶段标签
+    :param goal: 批次大小的选择目标，throughput 或 tail，见 BatchPlanner
+    :param min_batch_size: 候选批次大小的下限，需小于 index.max_terms_count，默认从 1024 起按 2 倍探索到上限
+    :param slim: composite 聚合响应是否用 filter_path 精简
+    """
+    # 第一步：PIT + search_after 切片并发读取符合条件的person ID
     def get_person_ids():
         start_time = time.time()
-        print("开始获取符合条件的person ID...")
+        print(f"开始获取符合条件的person ID，切片数: {slices}...")
 
         query = {
-            "size": 1000,
-            "query": {
-                "bool": {
-                    "must": [
-                        {"term": {"rep_office": 11}},
-                        {"term": {"rep": 10}}
-                    ]
-                }
+            "bool": {
+                "must": [
+                    {"term": {"rep_office": 11}},
+                    {"term": {"rep": 10}}
+                ]
             }
         }
 
-        response = es.search(index="person", body=query, scroll="1m")
-        scroll_id = response['_scroll_id']
-        person_ids = [hit['_id'] for hit in response['hits']['hits']]
-
-        while len(response['hits']['hits']) > 0:
-            response = es.scroll(scroll_id=scroll_id, scroll="1m")
-            scroll_id = response['_scroll_id']
-            hits = response['hits']['hits']
-
-            if hits:
-                person_ids.extend([hit['_id'] for hit in hits])
+        # ID 以 16 字节二进制形式存入 UuidStore，而不是保留 Python 字符串列表
+        person_ids = UuidStore(spill_path=spill_path)
+        person_ids.extend(hit['_id'] for hit in iter_pit_hits(es, "person", query, slices=slices, size=1000, source=False))
 
         end_time = time.time()
         print(
-            f"获取person ID完成，共获取到 {len(person_ids)} 个符合条件的person ID，耗时: {end_time - start_time:.2f} 秒")
+            f"获取person ID完成，共获取到 {len(person_ids)} 个符合条件的person ID，"
+            f"占用 {person_ids.nbytes() / 1024 ** 2:.2f} MB，耗时: {end_time - start_time:.2f} 秒")
         return person_ids
 
     # 第二步：根据person ID查询group索引并进行统计
+    # 用 composite 聚合分页遍历所有 group_id 桶，多个 group_id 分区并发执行
     def aggregate_groups(person_ids_batch):
         start_time = time.time()
         print(f"开始处理批次，包含 {len(person_ids_batch)} 个person ID...")
 
-        query = {
-            "size": 0,
-            "aggs": {
-                "groups": {
-                    "terms": {
-                        "field": "group_id"
-                    },
-                    "aggs": {
-                        "filtered_persons": {
-                            "nested": {
-                                "path": "person_list"
-                            },
-                            "aggs": {
-                                "matched_persons": {
-                                    "filter": {
-                                        "terms": {
-                                            "person_list.id": person_ids_batch
-                                        }
-                                    },
-                                    "aggs": {
-                                        "total_count": {
-                                            "value_count": {
-                                                "field": "person_list.id"
-                                            }
-                                        },
-                                        "age_gt_35": {
-                                            "filter": {
-                                                "range": {
-                                                    "person_list.age": {
-                                                        "gt": 35
-                                                    }
-                                                }
-                                            },
-                                            "aggs": {
-                                                "count_age_gt_35": {
-                                                    "value_count": {
-                                                        "field": "person_list.id"
-                                                    }
-                                                }
-                                            }
-                                        },
-                                        "birthday_after_2000": {
-                                            "filter": {
-                                                "range": {
-                                                    "person_list.birthday": {
-                                                        "gt": "2000-01-01"
-                                                    }
-                                                }
-                                            },
-                                            "aggs": {
-                                                "count_birthday_after_2000": {
-                                                    "value_count": {
-                                                        "field": "person_list.id"
-                                                    }
-                                                }
-                                            }
-                                        }
-                                    }
-                                }
-                            }
-                        }
-                    }
-                }
+        aggs = build_group_aggs(person_ids_batch)
+
+        def group_row(bucket):
+            matched = bucket['filtered_persons']['matched_persons']
+            return {
+                "group_id": bucket['key']['group_id'],
+                "group_name": bucket.get('key_as_string', 'Unknown Group'),
+                "total_count": matched['total_count']['value'],
+                "count_age_gt_35": matched['age_gt_35']['count_age_gt_35']['value'],
+                "count_birthday_after_2000": matched['birthday_after_2000']['count_birthday_after_2000']['value']
             }
-        }
 
-        response = es.search(index="group", body=query)
+        yield from iter_composite_buckets(
+            es, "group",
+            sources=[{"group_id": {"terms": {"field": "group_id"}}}],
+            aggs=aggs,
+            partitions=hex_prefix_partitions("group_id", partitions),
+            page_size=page_size,
+            row=group_row,
+            slim=slim
+        )
         end_time = time.time()
         print(f"处理批次完成，耗时: {end_time - start_time:.2f} 秒")
-        return response
 
     # 获取符合条件的person ID
     person_ids = get_person_ids()
-    if not person_ids:
+    if not len(person_ids):
         print("没有符合条件的person记录")
         return
 
-    # 分批处理person IDs
-    batch_size = 65536  # 每批次最多65536个ID
-    all_results = {}
-    total_batches = (len(person_ids) + batch_size - 1) // batch_size
+    # 分批处理person IDs，最多 concurrency 个批次同时在途
+    # 批次大小不再固定为 65536，由 planner 在集群限制内按实测延迟选择
+    planner = BatchPlanner(max_batch_size(es, "group"), goal=goal, min_size=min_batch_size,
+                           samples_per_size=1, explore_every=8)
+    reducer = GroupStatsReducer()
+    total_batches = 0
     batch_start_time = time.time()
 
-    for i in range(0, len(person_ids), batch_size):
-        batch = person_ids[i:i + batch_size]
-        result = aggregate_groups(batch)
-
-        # 合并结果
-        for bucket in result['aggregations']['groups']['buckets']:
-            group_id = bucket['key']
-            if group_id not in all_results:
-                all_results[group_id] = {
-                    "group_name": None,
-                    "total_count": 0,
-                    "count_age_gt_35": 0,
-                    "count_birthday_after_2000": 0
-                }
-
-            all_results[group_id]['group_name'] = bucket.get('key_as_string', 'Unknown Group')
-            all_results[group_id]['total_count'] += bucket['filtered_persons']['matched_persons']['total_count'][
-                'value']
-            all_results[group_id]['count_age_gt_35'] += \
-            bucket['filtered_persons']['matched_persons']['age_gt_35']['count_age_gt_35']['value']
-            all_results[group_id]['count_birthday_after_2000'] += \
-            bucket['filtered_persons']['matched_persons']['birthday_after_2000']['count_birthday_after_2000']['value']
+    def run_batch(batch):
+        # batch 是 UuidStore 的切片视图，发送前才转换成字符串
+        return list(aggregate_groups(UuidStore.to_strings(batch)))
+
+    if monitor is not None:
+        run_batch = monitor.timed(run_batch)
+        monitor.set_phase("measured")
+    # 合并结果
+    for rows in iter_planned(planner, person_ids.view(), run_batch, concurrency=concurrency):
+        reducer.add_rows(rows)
+        total_batches += 1
+    all_results = reducer.to_dict()
+    if monitor is not None:
+        monitor.set_phase("idle")
+    planner.report()
 
     batch_end_time = time.time()
-    print(f"所有批次处理完成，总耗时: {batch_end_time - batch_start_time:.2f} 秒")
+    print(f"所有批次处理完成，共 {total_batches} 批，{len(all_results)} 个group，总耗时: {batch_end_time - batch_start_time:.2f} 秒")
 
     # 保存最终结果
     save_start_time = time.time()
@@ -277,12 +322,31 @@ def aggregate_group_data():
     save_end_time = time.time()
     print(f"保存最终结果完成，耗时: {save_end_time - save_start_time:.2f} 秒")
 
+def profile_group_aggregation(batch_size=65536, page_size=1000, output=None):
+    """
+    用 profile API 对比同一批person ID下 terms 聚合与 composite 聚合（第一页）的耗时构成
+    """
+    person_ids = [hit['_id'] for _, hit in zip(range(batch_size), iter_pit_hits(es, "person", source=False))]
+    aggs = build_group_aggs(person_ids)
+    variants = {
+        "terms": {"size": 0, "aggs": {"groups": {"terms": {"field": "group_id", "size": page_size}, "aggs": aggs}}},
+        "composite": {"size": 0, "aggs": {"groups": {
+            "composite": {"sources": [{"group_id": {"terms": {"field": "group_id"}}}], "size": page_size},
+            "aggs": aggs}}}
+    }
+    return compare_profiles(es, "group", variants, output=output)
+
+
 def main():
     # 创建索引
     # create_indices()
 
     # 加载person数据
     # load_person_data(1_500_000)
+    # 多进程并行加载person数据
+    # load_person_data(1_500_000, workers=8, in_flight=2)
+    # 使用索引默认设置写入，与批量写入模式对比吞吐
+    # load_person_data(1_500_000, fast=False)
 
     # 加载group数据
     # load_group_data(5000)
@@ -290,5 +354,15 @@ def main():
     # 查询并统计
     aggregate_group_data()
 
+    # terms 聚合与 composite 聚合的 profile 对比
+    # profile_group_aggregation(output="group_profile.json")
+
+    # 统计的同时在后台采集集群指标，输出批次耗时与节点状态的对照报告
+    # from es.like_test.monitor_cluster_performance import BackgroundMonitor
+    # with BackgroundMonitor() as monitor:
+    #     aggregate_group_data(monitor=monitor)
+    #     monitor.cooldown(10)
+    # monitor.report("aggregate_monitor.csv")
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,69 @@
+from functools import partial
+
+from elasticsearch import ApiError
+
+from es.concurrent_pages import iter_concurrent_pages
+
+
+def primary_shard_count(es, index):
+    """
+    获取索引的主分片数，切片数超过主分片数后吞吐一般不再提升
+    """
+    settings = es.indices.get_settings(index=index, name="index.number_of_shards")
+    return sum(int(s["settings"]["index"]["number_of_shards"]) for s in settings.values())
+
+
+def iter_pit_hits(es, index, query=None, slices=1, size=1000, keep_alive="1m", source=None, queue_pages=None):
+    """
+    使用 point-in-time + search_after 并发读取索引中的所有命中文档
+
+    :param es: Elasticsearch 客户端（多线程共享）
+    :param index: 索引名称
+    :param query: 查询条件，默认为 match_all
+    :param slices: 切片数，每个切片一个线程，超过主分片数时按主分片数处理
+    :param size: 每页文档数
+    :param keep_alive: PIT 保持时间
+    :param source: 传给 _source 的值，例如 False 表示只取 _id
+    :param queue_pages: 最多缓存的页数，默认为 slices * 2，用于限制内存
+    :return: 按到达顺序返回 hit 的迭代器，迭代结束或中途退出时都会关闭 PIT
+    """
+    if slices > 1:
+        slices = max(1, min(slices, primary_shard_count(es, index)))
+    pit_id = es.open_point_in_time(index=index, keep_alive=keep_alive)["id"]
+    pit_ids = {pit_id}
+
+    def read_slice(slice_id):
+        body = {
+            "size": size,
+            "query": query or {"match_all": {}},
+            "pit": {"id": pit_id, "keep_alive": keep_alive},
+            "sort": ["_shard_doc"],
+            "track_total_hits": False
+        }
+        if slices > 1:
+            body["slice"] = {"id": slice_id, "max": slices}
+        if source is not None:
+            body["_source"] = source
+
+        while True:
+            response = es.search(body=body)
+            hits = response["hits"]["hits"]
+            if not hits:
+                return
+            yield hits
+            if len(hits) < size:
+                return
+            body["search_after"] = hits[-1]["sort"]
+            # 每次响应都可能返回新的 PIT id
+            body["pit"]["id"] = response.get("pit_id", body["pit"]["id"])
+            pit_ids.add(body["pit"]["id"])
+
+    try:
+        yield from iter_concurrent_pages([partial(read_slice, i) for i in range(slices)], queue_pages)
+    finally:
+        for pid in pit_ids:
+            # PIT 可能已经过期（NotFoundError），关闭失败不能掩盖原来的异常，也不能影响其他 PIT 的关闭
+            try:
+                es.close_point_in_time(id=pid)
+            except ApiError as e:
+                print(f"关闭 PIT 失败: {e}")
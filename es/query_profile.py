@@ -0,0 +1,142 @@
+import copy
+import json
+
+
+def profile_search(es, index, body):
+    """
+    以 "profile": true 重新执行查询，返回响应中的 profile 部分
+    """
+    body = copy.deepcopy(body)
+    body["profile"] = True
+    response = es.search(index=index, body=body)
+    return {"took": response.get("took"), "profile": response["profile"]}
+
+
+def _node(kind, item, children):
+    """
+    统一查询、收集器、聚合、fetch 节点的结构，self_ms 为去掉子节点后的自身耗时
+    """
+    time_ms = item.get("time_in_nanos", 0) / 1e6
+    breakdown = {k: v / 1e6 for k, v in item.get("breakdown", {}).items()
+                 if not k.endswith("_count") and isinstance(v, (int, float)) and v}
+    return {
+        "kind": kind,
+        "type": item.get("type") or item.get("name", "unknown"),
+        "description": item.get("description") or item.get("reason", ""),
+        "time_ms": time_ms,
+        "self_ms": max(0.0, time_ms - sum(c["time_ms"] for c in children)),
+        "breakdown": breakdown,
+        "children": children,
+    }
+
+
+def _convert(kind, item):
+    return _node(kind, item, [_convert(kind, c) for c in item.get("children", [])])
+
+
+def normalize_profile(profile):
+    """
+    把 profile 响应转换为每个分片一棵树：query / collector / aggregation / fetch 节点使用相同的字段
+    """
+    shards = []
+    for shard in profile.get("shards", []):
+        children = []
+        for search in shard.get("searches", []):
+            children.extend(_convert("query", q) for q in search.get("query", []))
+            children.extend(_convert("collector", c) for c in search.get("collector", []))
+        children.extend(_convert("aggregation", a) for a in shard.get("aggregations", []))
+        if shard.get("fetch"):
+            children.append(_convert("fetch", shard["fetch"]))
+        shards.append({"shard": shard.get("id"), "time_ms": sum(c["time_ms"] for c in children), "children": children})
+    return shards
+
+
+def time_by_type(shards):
+    """
+    按 (kind, type) 汇总所有分片上的自身耗时，返回 {"kind:type": ms}，按耗时降序
+    """
+    totals = {}
+
+    def walk(node):
+        key = f"{node['kind']}:{node['type']}"
+        totals[key] = totals.get(key, 0.0) + node["self_ms"]
+        for child in node["children"]:
+            walk(child)
+
+    for shard in shards:
+        for node in shard["children"]:
+            walk(node)
+    return dict(sorted(totals.items(), key=lambda kv: -kv[1]))
+
+
+def format_tree(shards, max_description=80):
+    """
+    以缩进文本输出每个分片的 profile 树
+    """
+    lines = []
+
+    def walk(node, depth):
+        description = node["description"]
+        if len(description) > max_description:
+            description = description[:max_description - 3] + "..."
+        top = sorted(node["breakdown"].items(), key=lambda kv: -kv[1])[:3]
+        phases = ", ".join(f"{k} {v:.2f}" for k, v in top)
+        lines.append(f"{'  ' * depth}{node['kind']}:{node['type']} {node['time_ms']:.2f}ms "
+                     f"(自身 {node['self_ms']:.2f}ms) {description}" + (f" [{phases}]" if phases else ""))
+        for child in node["children"]:
+            walk(child, depth + 1)
+
+    for shard in shards:
+        lines.append(f"分片 {shard['shard']}: {shard['time_ms']:.2f}ms")
+        for node in shard["children"]:
+            walk(node, 1)
+    return "\n".join(lines)
+
+
+def diff_profiles(profiles):
+    """
+    并排对比多个查询版本每种节点类型的耗时
+
+    :param profiles: {label: normalize_profile 的结果}
+    :return: (文本, 行列表)，行形如 {"node": "query:BooleanQuery", label1: ms, label2: ms}
+    """
+    by_label = {label: time_by_type(shards) for label, shards in profiles.items()}
+    keys = list(dict.fromkeys(k for totals in by_label.values() for k in totals))
+    labels = list(profiles)
+
+    rows = [{"node": key, **{label: by_label[label].get(key, 0.0) for label in labels}} for key in keys]
+    rows.append({"node": "total", **{label: sum(by_label[label].values()) for label in labels}})
+
+    width = max([len(r["node"]) for r in rows] + [4])
+    header = f"{'node':<{width}} " + " ".join(f"{label:>14}" for label in labels)
+    lines = [header, "-" * len(header)]
+    for row in rows:
+        lines.append(f"{row['node']:<{width}} " + " ".join(f"{row[label]:>12.2f}ms" for label in labels))
+    return "\n".join(lines), rows
+
+
+def compare_profiles(es, index, variants, output=None):
+    """
+    对多个查询版本分别执行 profile，输出每个版本的树和按节点类型的耗时对比
+
+    :param variants: {label: 查询 body}
+    :param output: 不为 None 时把规范化后的树和对比结果保存为 JSON
+    """
+    results = {}
+    for label, body in variants.items():
+        # 先执行一次，避免把首次执行的缓存加载、脚本编译算进 profile
+        es.search(index=index, body=body)
+        captured = profile_search(es, index, body)
+        results[label] = {"took": captured["took"], "shards": normalize_profile(captured["profile"])}
+        print(f"=== {label} (took {captured['took']}ms) ===")
+        print(format_tree(results[label]["shards"]))
+
+    text, rows = diff_profiles({label: r["shards"] for label, r in results.items()})
+    print("=== 按节点类型的自身耗时（所有分片合计） ===")
+    print(text)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump({"variants": results, "diff": rows}, f, indent=2, ensure_ascii=False)
+        print(f"profile 结果已保存到 {output}")
+    return results, rows
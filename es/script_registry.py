@@ -0,0 +1,92 @@
+import copy
+import hashlib
+from contextlib import contextmanager
+
+
+class ScriptRegistry:
+    """
+    把 painless 脚本部署为 stored script，并把查询中的内联脚本替换为按 id 引用
+
+    id 由脚本名和源码哈希组成，源码改动后会生成新的 id，不会覆盖旧版本
+    """
+
+    def __init__(self, lang="painless"):
+        self.lang = lang
+        self.sources = {}
+
+    def register(self, name, source):
+        self.sources[name] = source
+        return self.script_id(name)
+
+    def script_id(self, name):
+        digest = hashlib.sha1(self.sources[name].encode("utf-8")).hexdigest()[:8]
+        return f"{name}-{digest}"
+
+    def deploy(self, es):
+        """
+        把所有已注册脚本写入集群，返回 {name: script_id}
+        """
+        ids = {}
+        for name, source in self.sources.items():
+            script_id = self.script_id(name)
+            es.put_script(id=script_id, script={"lang": self.lang, "source": source})
+            ids[name] = script_id
+        print(f"已部署 {len(ids)} 个 stored script: {', '.join(ids.values())}")
+        return ids
+
+    def rewrite(self, query):
+        """
+        返回查询的副本，其中源码已注册的内联脚本改为 {"id": ..., "params": ...}
+        """
+        by_source = {source: self.script_id(name) for name, source in self.sources.items()}
+
+        def walk(node):
+            if isinstance(node, dict):
+                source = node.get("source")
+                if isinstance(source, str) and source in by_source:
+                    stored = {"id": by_source[source]}
+                    if "params" in node:
+                        stored["params"] = node["params"]
+                    return stored
+                return {k: walk(v) for k, v in node.items()}
+            if isinstance(node, list):
+                return [walk(v) for v in node]
+            return node
+
+        return walk(copy.deepcopy(query))
+
+
+def script_stats(es):
+    """
+    汇总所有节点的脚本编译统计：compilations、cache_evictions、compilation_limit_triggered
+
+    优先使用 script 统计，旧版本节点上没有时退回 script_cache.sum
+    """
+    response = es.nodes.stats(metric="script,script_cache", filter_path="nodes.*.script,nodes.*.script_cache.sum")
+    totals = {"compilations": 0, "cache_evictions": 0, "compilation_limit_triggered": 0}
+    for node in response.get("nodes", {}).values():
+        stats = node.get("script") or node.get("script_cache", {}).get("sum", {})
+        for key in totals:
+            totals[key] += stats.get(key, 0)
+    return totals
+
+
+@contextmanager
+def track_script_stats(es):
+    """
+    统计 with 代码块执行期间的脚本编译次数、缓存淘汰次数和编译限流次数的变化
+
+    节点统计中没有缓存命中数，编译次数不随请求数增长即说明脚本被缓存复用
+    :return: 代码块结束后填充好的统计 dict
+    """
+    before = script_stats(es)
+    delta = {}
+    try:
+        yield delta
+    finally:
+        after = script_stats(es)
+        delta.update({key: after[key] - before[key] for key in before})
+        print(f"脚本编译: {delta['compilations']} 次, 缓存淘汰: {delta['cache_evictions']} 次, "
+              f"触发编译限流: {delta['compilation_limit_triggered']} 次")
+        if delta["compilation_limit_triggered"]:
+            print("警告: 触发了脚本编译限流，继续下去可能出现 circuit_breaking_exception")
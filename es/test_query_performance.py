@@ -1,95 +1,234 @@
+import argparse
 import time
 
-from elasticsearch import Elasticsearch
+from es.bench_harness import BenchmarkHarness
+from es.es_client import get_client
+from es.load_generator import LOAD_WORKERS, load_client, sweep_concurrency, sweep_rates
+from es.pit_reader import iter_pit_hits
+from es.query_profile import compare_profiles
+from es.script_registry import ScriptRegistry, track_script_stats
 
-# 连接到 Elasticsearch
-es = Elasticsearch([{'host': 'localhost', 'port': 9200, 'scheme': 'http'}])
+index_name = 'test_index'
+
+# 默认查询参数
+DEFAULT_REGION = [
+    "1002",
+    "1004",
+    "a1"
+]
+DEFAULT_REP_OFFICE = [
+    "2009",
+    "2009",
+    "2009",
+    "2009",
+    "2009",
+    "All",
+    "2009",
+    "2009",
+    "2010",
+    "1000000"
+]
+
+# nested 文档中 region / repOffice 必须包含所有请求的取值（含 All 时直接通过）
+DIVISION_SCRIPT = """
+    // 获取 division_desc.region 字段的值
+    def division_region = doc['division_desc.region'];
+    def regions = params.region;
+
+    if(!division_region.isEmpty()&&!division_region.contains('All')){
+       if(regions==null||regions.isEmpty()){
+         return false;
+       }
+       for(def item:regions){
+         if(!division_region.contains(item)){
+           return false;
+         }
+       }
+    }
+
+    // 获取 division_desc.repOffice 字段的值
+    def division_rep_office = doc['division_desc.repOffice'];
+    def repOffice = params.repOffice;
+
+    if(!division_rep_office.isEmpty()&&!division_rep_office.contains('All')){
+       if(repOffice==null||repOffice.isEmpty()){
+         return false;
+       }
+       for(def item:repOffice){
+         if(!division_rep_office.contains(item)){
+           return false;
+         }
+       }
+    }
+    return true;
+"""
+
+scripts = ScriptRegistry()
+scripts.register("division_filter", DIVISION_SCRIPT)
 
-# 检查连接是否成功
-if not es.ping():
-    raise ValueError("Connection failed")
 
 # 定义查询
-query = {
-    "query": {
-        "nested": {
-            "path": "division_desc",
-            "query": {
-                "bool": {
-                    "must": [
-                        {
-                            "script": {
+def build_script_query(region, rep_office):
+    return {
+        "query": {
+            "nested": {
+                "path": "division_desc",
+                "query": {
+                    "bool": {
+                        "must": [
+                            {
                                 "script": {
-                                    "source": """
-                                    // 获取 division_desc.region 字段的值
-                                    def division_region = doc['division_desc.region'];
-                                    def regions = params.region;
-                                    
-                                    if(!division_region.isEmpty()&&!division_region.contains('All')){
-                                       if(regions==null||regions.isEmpty()){
-                                         return false;
-                                       }
-                                       for(def item:regions){
-                                         if(!division_region.contains(item)){
-                                           return false;
-                                         }
-                                       }
-                                    }
-                                    
-                                    // 获取 division_desc.repOffice 字段的值
-                                    def division_rep_office = doc['division_desc.repOffice'];
-                                    def repOffice = params.repOffice;
-                                    
-                                    if(!division_rep_office.isEmpty()&&!division_rep_office.contains('All')){
-                                       if(repOffice==null||repOffice.isEmpty()){
-                                         return false;
-                                       }
-                                       for(def item:repOffice){
-                                         if(!division_rep_office.contains(item)){
-                                           return false;
-                                         }
-                                       }
-                                    }
-                                    return true;         
-                                    """,
-                                    "params": {
-                                        "region": [
-                                            "1002",
-                                            "1004",
-                                            "a1"
-                                        ],
-                                        "repOffice": [
-                                            "2009",
-                                            "2009",
-                                            "2009",
-                                            "2009",
-                                            "2009",
-                                            "All",
-                                            "2009",
-                                            "2009",
-                                            "2010",
-                                            "1000000"
-                                        ]
+                                    "script": {
+                                        "source": DIVISION_SCRIPT,
+                                        "params": {
+                                            "region": region,
+                                            "repOffice": rep_office
+                                        }
                                     }
                                 }
                             }
-                        }
-                    ]
+                        ]
+                    }
+                }
+            }
+        }
+    }
+
+
+def _contains_all_clause(field, values):
+    """
+    与脚本中单个字段的判断等价：字段为空或包含 All 时直接通过，
+    否则字段必须包含 values 中的每一个取值（values 为空时不通过）
+    """
+    should = [
+        {"bool": {"must_not": {"exists": {"field": field}}}},
+        {"term": {field: "All"}}
+    ]
+    values = list(dict.fromkeys(values or []))
+    # 请求的取值中包含 All 时，只有字段本身包含 All 才能满足，不需要再逐个判断
+    if values and "All" not in values:
+        should.append({"bool": {"filter": [{"term": {field: v}} for v in values]}})
+    return {"bool": {"should": should, "minimum_should_match": 1}}
+
+
+# 不使用脚本、只依赖倒排索引的等价查询
+def build_native_query(region, rep_office):
+    return {
+        "query": {
+            "nested": {
+                "path": "division_desc",
+                "query": {
+                    "bool": {
+                        "filter": [
+                            _contains_all_clause("division_desc.region", region),
+                            _contains_all_clause("division_desc.repOffice", rep_office)
+                        ]
+                    }
                 }
             }
         }
     }
-}
 
-# 记录开始时间
-start_time = time.time()
 
-# 执行查询
-response = es.search(index='test_index', body=query)
+def check_native_query(es, region, rep_office, slices=2):
+    """
+    差异校验：分别取出脚本查询和原生查询的全部命中文档 ID，确认两者完全一致
+    """
+    script_ids = {hit["_id"] for hit in iter_pit_hits(es, index_name, build_script_query(region, rep_office)["query"],
+                                                       slices=slices, source=False)}
+    native_ids = {hit["_id"] for hit in iter_pit_hits(es, index_name, build_native_query(region, rep_office)["query"],
+                                                       slices=slices, source=False)}
+    only_script = script_ids - native_ids
+    only_native = native_ids - script_ids
+    print(f"脚本查询命中 {len(script_ids)} 条，原生查询命中 {len(native_ids)} 条，"
+          f"仅脚本命中 {len(only_script)} 条，仅原生命中 {len(only_native)} 条")
+    if only_script or only_native:
+        print(f"  差异示例: 仅脚本 {sorted(only_script)[:10]}，仅原生 {sorted(only_native)[:10]}")
+    return not only_script and not only_native
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m es.test_query_performance", description="nested script 查询性能测试")
+    parser.add_argument("--warmup", type=int, default=5, help="预热次数")
+    parser.add_argument("--iterations", type=int, default=50, help="测量次数")
+    parser.add_argument("--output", default=None, help="结果 JSON 文件路径")
+    parser.add_argument("--rates", default=None, help="开环压测的目标 QPS 列表，逗号分隔，例如 5,10,20,50")
+    parser.add_argument("--concurrency", default=None,
+                        help="闭环压测的并发数列表，逗号分隔，例如 1,4,16，可与 --rates 一起使用对比两种压测方式")
+    parser.add_argument("--duration", type=int, default=30, help="每个压测速率或并发数的持续秒数")
+    parser.add_argument("--variant", choices=["script", "native"], default="script", help="压测使用的查询版本")
+    parser.add_argument("--check", action="store_true", help="校验原生查询与脚本查询的命中结果一致")
+    parser.add_argument("--profile", nargs="?", const="", default=None,
+                        help="用 profile API 对比脚本查询和原生查询的耗时构成，可指定 JSON 输出路径")
+    parser.add_argument("--stored-scripts", action="store_true", help="部署 stored script，脚本查询按 id 引用")
+    args = parser.parse_args()
+
+    # 连接到 Elasticsearch
+    es = get_client()
+
+    # 检查连接是否成功
+    if not es.ping():
+        raise ValueError("Connection failed")
+
+    query = build_script_query(DEFAULT_REGION, DEFAULT_REP_OFFICE)
+    native_query = build_native_query(DEFAULT_REGION, DEFAULT_REP_OFFICE)
+    if args.stored_scripts:
+        scripts.deploy(es)
+        query = scripts.rewrite(query)
+
+    if args.check and not check_native_query(es, DEFAULT_REGION, DEFAULT_REP_OFFICE):
+        raise ValueError("原生查询与脚本查询结果不一致")
+
+    if args.profile is not None:
+        compare_profiles(es, index_name, {"script": query, "native": native_query}, output=args.profile or None)
+
+    # 记录开始时间
+    start_time = time.time()
+
+    # 执行查询
+    response = es.search(index=index_name, body=query)
+
+    # 记录结束时间
+    end_time = time.time()
+
+    # 输出查询结果和性能指标
+    print(f"Query took {end_time - start_time:.2f} seconds")
+    print(f"Total hits: {response['hits']['total']['value']}")
+
+    # 预热后多次测量，输出延迟分布
+    harness = BenchmarkHarness(warmup=args.warmup, iterations=args.iterations)
+    harness.register("nested_script", lambda: es.search(index=index_name, body=query))
+    harness.register("nested_native", lambda: es.search(index=index_name, body=native_query))
+    # 对比测量前后的脚本编译次数
+    with track_script_stats(es):
+        results = harness.run()
+    harness.report(results)
+    if args.output:
+        harness.save_json(results, args.output)
+
+    if not args.rates and not args.concurrency:
+        return
+
+    load_query = native_query if args.variant == "native" else query
+    rates = [float(r) for r in args.rates.split(",")] if args.rates else []
+    levels = [int(c) for c in args.concurrency.split(",")] if args.concurrency else []
+    # 压测使用连接池足够大的独立客户端，避免请求在客户端排队
+    threads = max(levels + ([LOAD_WORKERS] if rates else []))
+    load_es, pool_size = load_client(threads)
+
+    def run():
+        return load_es.search(index=index_name, body=load_query)
+
+    # 开环：按目标 QPS 逐步加压，找出饱和点
+    if rates:
+        print("开环压测:")
+        sweep_rates(run, rates, duration=args.duration, pool_size=pool_size)
+
+    # 闭环：固定并发数连续发送请求
+    if levels:
+        print("闭环压测:")
+        sweep_concurrency(run, levels, duration=args.duration, pool_size=pool_size)
 
-# 记录结束时间
-end_time = time.time()
 
-# 输出查询结果和性能指标
-print(f"Query took {end_time - start_time:.2f} seconds")
-print(f"Total hits: {response['hits']['total']['value']}")
+if __name__ == "__main__":
+    main()
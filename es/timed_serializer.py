@@ -0,0 +1,54 @@
+import json
+import threading
+import time
+
+from elasticsearch.serializer import JsonSerializer
+
+try:
+    import orjson
+except ImportError:  # 没有安装 orjson 时使用标准库 json
+    orjson = None
+
+
+class TimedJsonSerializer(JsonSerializer):
+    """
+    记录响应体字节数和 JSON 解码耗时的序列化器，安装了 orjson 且 use_orjson 为 True 时用 orjson 编解码
+
+    每个线程最近一次解码的结果用 last_decode() 读取，所有线程的累计值用 totals() 读取
+    """
+
+    def __init__(self, use_orjson=True):
+        self.use_orjson = use_orjson and orjson is not None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._totals = {"responses": 0, "bytes": 0, "seconds": 0.0}
+
+    @property
+    def library(self):
+        return "orjson" if self.use_orjson else "json"
+
+    def json_dumps(self, data):
+        if self.use_orjson:
+            return orjson.dumps(data, default=self.default, option=orjson.OPT_SERIALIZE_NUMPY)
+        return super().json_dumps(data)
+
+    def json_loads(self, data):
+        start = time.perf_counter()
+        result = orjson.loads(data) if self.use_orjson else json.loads(data)
+        seconds = time.perf_counter() - start
+        self._local.last = (len(data), seconds)
+        with self._lock:
+            self._totals["responses"] += 1
+            self._totals["bytes"] += len(data)
+            self._totals["seconds"] += seconds
+        return result
+
+    def last_decode(self):
+        """
+        返回当前线程最近一次解码的 (字节数, 秒数)
+        """
+        return getattr(self._local, "last", (0, 0.0))
+
+    def totals(self):
+        with self._lock:
+            return dict(self._totals)
@@ -0,0 +1,111 @@
+"""
+用 Python 模拟 Painless 脚本和查询 DSL 的语义，用于在没有集群的情况下校验等价查询
+"""
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+def _utf16_units(text):
+    # 与 Java String.charAt 一致，按 UTF-16 码元比较
+    raw = text.encode("utf-16-le")
+    return [raw[i:i + 2] for i in range(0, len(raw), 2)]
+
+
+def division_script(obj, region, rep_office):
+    """
+    test_query_performance.DIVISION_SCRIPT，obj 为一个 nested 文档，字段值为列表
+    """
+    for field, params in (("division_desc.region", region), ("division_desc.repOffice", rep_office)):
+        values = obj.get(field, [])
+        if values and "All" not in values:
+            if not params:
+                return False
+            if any(item not in values for item in params):
+                return False
+    return True
+
+
+def similarity_script_score(doc, name, age, birthday_ts):
+    """
+    excute_like 中三个 script_score 脚本的分数之和（score_mode 为 sum）
+    """
+    doc_name = doc.get("name")
+    if doc_name is None:
+        name_score = 1
+    else:
+        common = sum(a == b for a, b in zip(_utf16_units(name), _utf16_units(doc_name)))
+        name_score = 6 if common > 5 else 3 if common > 2 else 1
+
+    doc_age = doc.get("age")
+    if doc_age is None:
+        age_score = 1
+    else:
+        diff = abs(age - doc_age)
+        age_score = 5 if diff <= 5 else 2 if diff <= 3 else 1
+
+    doc_birthday = doc.get("birthday")
+    if doc_birthday is None:
+        birthday_score = 1
+    else:
+        days_diff = abs(doc_birthday - birthday_ts) // DAY_MS
+        birthday_score = 5 if days_diff < 1 else 4 if days_diff < 3 else 1
+
+    return name_score + age_score + birthday_score
+
+
+def _values(doc, field):
+    value = doc.get(field)
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _as_list(clauses):
+    if clauses is None:
+        return []
+    return clauses if isinstance(clauses, list) else [clauses]
+
+
+def _in_range(value, bounds):
+    checks = {"gt": value.__gt__, "gte": value.__ge__, "lt": value.__lt__, "lte": value.__le__}
+    return all(check(bounds[op]) for op, check in checks.items() if op in bounds)
+
+
+def matches(query, doc):
+    """
+    判断 doc 是否满足 query，只支持这些测试用到的查询类型
+    """
+    (kind, body), = query.items()
+    if kind == "match_all":
+        return True
+    if kind == "term":
+        (field, value), = body.items()
+        return value in _values(doc, field)
+    if kind == "exists":
+        return bool(_values(doc, body["field"]))
+    if kind == "range":
+        (field, bounds), = body.items()
+        return any(_in_range(value, bounds) for value in _values(doc, field))
+    if kind == "nested":
+        return any(matches(body["query"], obj) for obj in doc.get(body["path"], []))
+    if kind == "bool":
+        required = _as_list(body.get("must")) + _as_list(body.get("filter"))
+        should = _as_list(body.get("should"))
+        if not all(matches(q, doc) for q in required):
+            return False
+        if any(matches(q, doc) for q in _as_list(body.get("must_not"))):
+            return False
+        # 没有 must / filter 时 should 至少满足一个
+        minimum = body.get("minimum_should_match", 0 if required else 1) if should else 0
+        return sum(matches(q, doc) for q in should) >= minimum
+    raise ValueError(f"不支持的查询类型: {kind}")
+
+
+def function_score(query, doc):
+    """
+    score_mode 为 sum、boost_mode 为 replace 的 function_score 分数，不匹配时返回 None
+    """
+    body = query["function_score"]
+    assert body["score_mode"] == "sum" and body["boost_mode"] == "replace"
+    if not matches(body["query"], doc):
+        return None
+    return sum(f["weight"] for f in body["functions"] if "filter" not in f or matches(f["filter"], doc))
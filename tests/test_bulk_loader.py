@@ -0,0 +1,82 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from es import bulk_loader
+from es.bulk_loader import _load_shard, _split_records, parallel_load
+
+
+@pytest.mark.parametrize("num_records, shards", [(10, 3), (9, 3), (2, 4), (0, 2), (1_500_000, 7)])
+def test_split_records_covers_all_records(num_records, shards):
+    ranges = _split_records(num_records, shards)
+    # 各段首尾相接，覆盖全部记录，不产生空段
+    assert sum(count for _, count in ranges) == num_records
+    assert all(count > 0 for _, count in ranges)
+    assert [start for start, _ in ranges] == [sum(c for _, c in ranges[:i]) for i in range(len(ranges))]
+    counts = [count for _, count in ranges]
+    assert not counts or max(counts) - min(counts) <= 1
+    assert len(ranges) == min(num_records, shards)
+
+
+class FakeBulk:
+    """
+    代替 helpers.streaming_bulk / parallel_bulk，记录收到的 action，_id 在 failing 中的返回失败
+    """
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.actions = []
+        self.calls = []
+
+    def _run(self, name, es, actions, **kwargs):
+        self.calls.append((name, kwargs))
+        for action in actions:
+            self.actions.append(action)
+            yield action["_id"] not in self.failing, {}
+
+    def streaming_bulk(self, es, actions, **kwargs):
+        return self._run("streaming_bulk", es, actions, **kwargs)
+
+    def parallel_bulk(self, es, actions, **kwargs):
+        return self._run("parallel_bulk", es, actions, **kwargs)
+
+
+@pytest.fixture
+def fake_bulk(monkeypatch):
+    bulk = FakeBulk(failing={"doc-3"})
+    monkeypatch.setattr(bulk_loader, "helpers", bulk)
+    monkeypatch.setattr(bulk_loader, "get_client", lambda hosts: SimpleNamespace(options=lambda **kwargs: None))
+    return bulk
+
+
+def build_actions(start, count, seed=None):
+    for i in range(start, start + count):
+        yield f"doc-{i}", {"n": i, "seed": seed, "name": "张三"}
+
+
+@pytest.mark.parametrize("in_flight, helper", [(1, "streaming_bulk"), (4, "parallel_bulk")])
+def test_load_shard_stats(fake_bulk, in_flight, helper):
+    stats = _load_shard(2, None, "person", build_actions, 0, 10, 7, 500, in_flight, 60)
+    assert stats["worker"] == 2
+    assert (stats["docs"], stats["failed"]) == (9, 1)
+    # _source 预先序列化为 JSON 字符串，字节数按 UTF-8 统计
+    sources = [action["_source"] for action in fake_bulk.actions]
+    assert all(isinstance(source, str) for source in sources)
+    assert stats["bytes"] == sum(len(source.encode("utf-8")) for source in sources)
+    assert json.loads(sources[0]) == {"n": 0, "seed": 7, "name": "张三"}
+    assert fake_bulk.calls[0][0] == helper
+    assert fake_bulk.calls[0][1]["chunk_size"] == 500
+
+
+def test_parallel_load_merges_worker_stats(fake_bulk, monkeypatch):
+    # 用线程池代替进程池，测试中的 fake 不需要跨进程
+    monkeypatch.setattr(bulk_loader, "ProcessPoolExecutor", ThreadPoolExecutor)
+    all_stats = parallel_load(None, "person", build_actions, 10, workers=3, in_flight=1, seed=100)
+    assert [s["worker"] for s in all_stats] == [0, 1, 2]
+    assert sum(s["docs"] for s in all_stats) == 9
+    assert sum(s["failed"] for s in all_stats) == 1
+    # 每个 worker 只写自己那一段，种子为 seed + worker_id
+    docs = sorted((json.loads(a["_source"])["n"], json.loads(a["_source"])["seed"]) for a in fake_bulk.actions)
+    assert docs == [(n, 100 + (0 if n < 4 else 1 if n < 7 else 2)) for n in range(10)]
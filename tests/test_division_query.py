@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+from es.test_query_performance import DEFAULT_REGION, DEFAULT_REP_OFFICE, build_native_query
+from tests.painless import division_script, matches
+
+DIVISION_VALUES = ["1002", "1004", "a1", "2009", "2010", "All"]
+
+
+def _random_values(rng, max_size=3):
+    return rng.sample(DIVISION_VALUES, rng.randint(0, max_size))
+
+
+def _division_doc(rng):
+    objects = []
+    for _ in range(rng.randint(1, 3)):
+        obj = {}
+        for field in ("division_desc.region", "division_desc.repOffice"):
+            values = _random_values(rng)
+            if values:
+                obj[field] = values
+        objects.append(obj)
+    return {"division_desc": objects}
+
+
+def _script_matches(doc, region, rep_office):
+    # 脚本查询在 nested 上下文中执行，任意一个 nested 文档满足即命中
+    return any(division_script(obj, region, rep_office) for obj in doc["division_desc"])
+
+
+def _params(rng):
+    values = _random_values(rng, max_size=4)
+    # 请求参数可能包含重复值，也可能为 None
+    if values and rng.random() < 0.3:
+        values.append(values[0])
+    return None if rng.random() < 0.1 else values
+
+
+def test_division_native_query_matches_script():
+    rng = random.Random(0)
+    docs = [_division_doc(rng) for _ in range(300)]
+    cases = [(DEFAULT_REGION, DEFAULT_REP_OFFICE)] + [(_params(rng), _params(rng)) for _ in range(100)]
+    for region, rep_office in cases:
+        query = build_native_query(region, rep_office)["query"]
+        for doc in docs:
+            assert matches(query, doc) == _script_matches(doc, region, rep_office), (region, rep_office, doc)
+
+
+@pytest.mark.parametrize("obj, expected", [
+    ({}, True),
+    ({"division_desc.region": ["All"], "division_desc.repOffice": ["9999"]}, False),
+    ({"division_desc.region": ["1002", "1004", "a1", "x"], "division_desc.repOffice": ["All"]}, True),
+    ({"division_desc.region": ["1002", "1004"]}, False),
+])
+def test_division_native_query_default_params(obj, expected):
+    doc = {"division_desc": [obj]}
+    assert _script_matches(doc, DEFAULT_REGION, DEFAULT_REP_OFFICE) == expected
+    assert matches(build_native_query(DEFAULT_REGION, DEFAULT_REP_OFFICE)["query"], doc) == expected
@@ -0,0 +1,41 @@
+import pytest
+
+from es.id_lookup import murmur3_x86_32, shard_for_id
+
+
+# Elasticsearch Murmur3HashFunctionTests 中的参考值，路由值按 UTF-16 编码后哈希
+@pytest.mark.parametrize("routing, expected", [
+    ("hell", 0x5a0cb7c3),
+    ("hello", 0xd7c31989),
+    ("hello w", 0x22ab2984),
+    ("hello wo", 0xdf0ca123),
+    ("hello wor", 0xe7744d61),
+    ("The quick brown fox jumps over the lazy dog", 0xe07db09c),
+    ("The quick brown fox jumps over the lazy cog", 0x4e63d2ad),
+])
+def test_murmur3_matches_elasticsearch(routing, expected):
+    assert murmur3_x86_32(routing.encode("utf-16-le")) & 0xffffffff == expected
+
+
+# 标准 murmur3 x86 32 位参考值，覆盖 seed 和不足 4 字节的尾部
+@pytest.mark.parametrize("data, seed, expected", [
+    (b"", 0, 0),
+    (b"", 1, 0x514e28b7),
+    (b"hello", 0, 0x248bfa47),
+    (b"The quick brown fox jumps over the lazy dog", 0, 0x2e4ff723),
+])
+def test_murmur3_reference_vectors(data, seed, expected):
+    assert murmur3_x86_32(data, seed) & 0xffffffff == expected
+
+
+def test_murmur3_returns_signed_int():
+    assert murmur3_x86_32("hello".encode("utf-16-le")) == 0xd7c31989 - (1 << 32)
+
+
+def test_shard_for_id_in_range_and_consistent_with_split():
+    # routing_num_shards 固定时，分片数翻倍后文档只会落到原分片拆出的两个分片之一
+    for doc_id in range(2000):
+        shard = shard_for_id(doc_id, 1024, 4)
+        assert 0 <= shard < 4
+        assert shard_for_id(doc_id, 1024, 8) // 2 == shard
+        assert shard_for_id(doc_id, 1024, 1) == 0
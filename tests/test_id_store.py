@@ -0,0 +1,65 @@
+import uuid
+
+import numpy as np
+import pytest
+
+from es.id_store import UUID_BYTES, UuidStore
+
+
+def _ids(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [str(uuid.UUID(bytes=rng.bytes(16))) for _ in range(n)]
+
+
+def _round_trip(store, batch_size):
+    return [s for batch in store.batches(batch_size) for s in UuidStore.to_strings(batch)]
+
+
+def test_memory_round_trip_with_growth():
+    ids = _ids(1000)
+    store = UuidStore(capacity=8)
+    store.extend(ids, chunk=64)
+    assert len(store) == len(ids)
+    assert store.nbytes() == len(ids) * UUID_BYTES
+    assert _round_trip(store, 128) == ids
+
+
+def test_spill_round_trip_with_growth(tmp_path):
+    path = tmp_path / "ids.bin"
+    ids = _ids(1000, seed=1)
+    store = UuidStore(capacity=4, spill_path=str(path))
+    # chunk 大于初始容量，扩容时重新映射文件
+    store.extend(ids[:500], chunk=7)
+    store.extend(ids[500:], chunk=100)
+    assert isinstance(store.view(), np.memmap)
+    assert _round_trip(store, 97) == ids
+    assert path.stat().st_size >= store.nbytes()
+
+
+def test_accepts_ids_without_hyphens():
+    ids = _ids(10, seed=2)
+    store = UuidStore()
+    store.extend(i.replace("-", "") for i in ids)
+    assert _round_trip(store, 3) == ids
+
+
+def test_batches_are_views():
+    store = UuidStore()
+    store.extend(_ids(10, seed=3))
+    batch = next(store.batches(4))
+    assert np.shares_memory(batch, store.view())
+
+
+@pytest.mark.parametrize("bad", [
+    ["0001"],
+    ["not-a-uuid"],
+    # 总长度正好是两个 UUID，但单个 ID 长度不对，不能错位写入
+    ["0" * 31, "0" * 33],
+    ["1" * 32, "0" * 31, "0" * 33],
+])
+def test_rejects_non_uuid(bad):
+    store = UuidStore()
+    store.extend(_ids(2, seed=4))
+    with pytest.raises(ValueError):
+        store.extend(bad)
+    assert len(store) == 2
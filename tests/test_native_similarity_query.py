@@ -0,0 +1,42 @@
+import random
+from datetime import datetime
+
+from es.like_test.excute_like import build_native_similarity_query
+from es.like_test.generate_like_data import name_positions
+from tests.painless import DAY_MS, function_score, similarity_script_score
+
+
+def _mutate(rng, name, alphabet):
+    chars = list(name)
+    for i in rng.sample(range(len(chars)), rng.randint(0, len(chars))):
+        chars[i] = rng.choice(alphabet)
+    # 随机截断或加长，覆盖长度不同的姓名
+    if rng.random() < 0.3:
+        chars = chars[:rng.randint(1, len(chars))]
+    elif rng.random() < 0.3:
+        chars += rng.choices(alphabet, k=rng.randint(1, 3))
+    return "".join(chars)
+
+
+def test_native_similarity_query_matches_script_scores():
+    rng = random.Random(1)
+    alphabet = "张王李明月清风"
+    birthday = "1990-01-01"
+    birthday_ts = int(datetime.strptime(birthday, "%Y-%m-%d").timestamp() * 1000)
+    base_day = (datetime(1990, 1, 1) - datetime(1970, 1, 1)).days
+
+    for name in ("张", "王明", "李明月", "欧阳明月清风", "张王李明月清风来"):
+        for age in (18, 30, 60):
+            query = build_native_similarity_query(name, age, birthday)["query"]
+            for _ in range(200):
+                doc = {}
+                if rng.random() < 0.9:
+                    doc["name"] = _mutate(rng, name, alphabet)
+                    doc["name_pos"] = name_positions(doc["name"])
+                if rng.random() < 0.9:
+                    doc["age"] = age + rng.randint(-8, 8)
+                if rng.random() < 0.9:
+                    # date 字段按 UTC 零点存储
+                    doc["birthday"] = (base_day + rng.randint(-5, 5)) * DAY_MS
+                expected = similarity_script_score(doc, name, age, birthday_ts)
+                assert function_score(query, doc) == expected, (name, age, doc)
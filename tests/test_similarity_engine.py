@@ -0,0 +1,58 @@
+import random
+from datetime import datetime
+
+import numpy as np
+
+from es.like_test.similarity_engine import SimilarityEngine
+from tests.painless import DAY_MS, similarity_script_score
+
+BIRTHDAY = "1990-01-01"
+BASE_DAY = (datetime(1990, 1, 1) - datetime(1970, 1, 1)).days
+
+
+def _random_people(n, seed=0):
+    rng = random.Random(seed)
+    alphabet = "张王李明月清风"
+    names, ages, days = [], [], []
+    for _ in range(n):
+        names.append("".join(rng.choices(alphabet, k=rng.randint(1, 8))) if rng.random() < 0.9 else None)
+        ages.append(rng.randint(20, 40) if rng.random() < 0.9 else None)
+        days.append(BASE_DAY + rng.randint(-5, 5) if rng.random() < 0.9 else None)
+    return names, ages, days
+
+
+def _script_scores(names, ages, days, name, age, birthday):
+    birthday_ts = int(datetime.strptime(birthday, "%Y-%m-%d").timestamp() * 1000)
+    scores = []
+    for doc_name, doc_age, doc_days in zip(names, ages, days):
+        doc = {"name": doc_name, "age": doc_age, "birthday": None if doc_days is None else doc_days * DAY_MS}
+        scores.append(similarity_script_score(doc, name, age, birthday_ts))
+    return scores
+
+
+def test_score_matches_script():
+    names, ages, days = _random_people(2000)
+    engine = SimilarityEngine(list(range(len(names))), names, ages, days)
+    for name, age in (("张明", 30), ("王明月清风张李", 25), ("李", 20), ("张王李明月清风张王", 40)):
+        assert engine.score(name, age, BIRTHDAY).tolist() == _script_scores(names, ages, days, name, age, BIRTHDAY)
+
+
+def test_missing_fields_score_one_each():
+    engine = SimilarityEngine([1], [None], [None], [None])
+    assert engine.score("张三", 30, BIRTHDAY).tolist() == [3]
+
+
+def test_exact_match_scores_sixteen():
+    engine = SimilarityEngine(["a"], ["张王李明月清风"], [30], [BASE_DAY])
+    assert engine.score("张王李明月清风", 30, BIRTHDAY).tolist() == [16]
+
+
+def test_top_k_sorted_by_score():
+    names, ages, days = _random_people(500, seed=1)
+    engine = SimilarityEngine(np.arange(len(names)), names, ages, days)
+    scores = engine.score("张明月", 30, BIRTHDAY)
+    top = engine.top_k("张明月", 30, BIRTHDAY, k=20)
+    assert len(top) == 20
+    assert [s for _, s in top] == sorted(scores.tolist(), reverse=True)[:20]
+    assert all(scores[doc_id] == s for doc_id, s in top)
+    assert engine.top_k_batch([("张明月", 30, BIRTHDAY)], k=20) == [top]